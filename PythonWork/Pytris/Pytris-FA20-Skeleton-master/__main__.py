@@ -13,17 +13,35 @@ def main():
         from view import PytrisViewManager
         from board import Board
         from game_ctl import PytrisController
-        from colors import Color
+        from colors import EMPTY
+        from agent import HeuristicAgent
+        from search import BeamSearchAgent
+        from profiler import FrameProfiler
     except Exception:
-        print("Missing one of view.py board.py models.py or game_ctl.py")
+        print("Missing one of view.py board.py models.py game_ctl.py agent.py search.py or profiler.py")
         exit(1)
 
     pygame.init()
 
-    GUI = PytrisViewManager(pygame)
-    BOARD = Board(cell_item=(0, 0, 0))
+    # python . --coalesce updates the display once per frame
+    GUI = PytrisViewManager(pygame, coalesce='--coalesce' in sys.argv[1:])
+    BOARD = Board(cell_item=EMPTY, backend='bitboard', compact=True)
     
-    Pytris = PytrisController(BOARD, GUI)
+    # python . --agent watches the built-in agent play, --search the one
+    # that looks ahead, deciding within a frame
+    agent = None
+    if '--agent' in sys.argv[1:]:
+        agent = HeuristicAgent()
+    elif '--search' in sys.argv[1:]:
+        agent = BeamSearchAgent(time_budget=1/60)
+    # python . --record saves a replay of the game, see replay.py
+    replay_path = 'replay.json' if '--record' in sys.argv[1:] else None
+    # python . --profile logs the frame phase times and writes frames.csv
+    profiler = None
+    if '--profile' in sys.argv[1:]:
+        profiler = FrameProfiler(log_interval=5, csv_path='frames.csv')
+    Pytris = PytrisController(BOARD, GUI, agent=agent, replay_path=replay_path,
+                              profiler=profiler)
     Pytris.show_main_menu()
 
 if __name__ == "__main__":
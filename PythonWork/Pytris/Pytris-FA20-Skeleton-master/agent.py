@@ -0,0 +1,394 @@
+""" A built-in Pytris player: it scores every placement movegen finds for the
+    current pytromino with a weighted sum of board features and plays the
+    best one.
+
+    The features are those of the usual hand-tuned Tetris agents. A
+    FeatureBoard keeps them up to date as cells are filled, starting from the
+    row masks and column counters the Board already maintains, so scoring a
+    placement costs a few updates per block instead of a pass over the grid:
+
+    height           sum of the column heights
+    holes            empty cells below the top of their column
+    bumpiness        sum of the height differences of neighbouring columns
+    lines            rows cleared by the placement
+    wells            sum of the depths of the columns lower than both
+                     neighbours, walls count as full height
+    row_transitions  filled/empty changes along the rows, walls count as
+                     filled
+    col_transitions  filled/empty changes down the columns, the floor counts
+                     as filled
+"""
+from collections import namedtuple
+from engine import Action
+from movegen import Move, generate_placements, find_path
+
+Features = namedtuple('Features', [
+    'height', 'holes', 'bumpiness', 'lines', 'wells', 'row_transitions',
+    'col_transitions',
+])
+
+# Weights of the features in the score of a placement, higher is better.
+# Close to Dellacherie's, they did best of the sets tried with selfplay.py
+WEIGHTS = Features(
+    height=-0.1,
+    holes=-0.9,
+    bumpiness=-0.05,
+    lines=0.3,
+    wells=-0.15,
+    row_transitions=-0.5,
+    col_transitions=-0.7,
+)
+
+
+class FeatureBoard:
+    """ The occupancy of a board as row masks together with the features of
+        the module docstring, updated incrementally by place()
+
+    >>> from board import Board
+    >>> board = Board(4, 4, 0, grid=[0, 0, 0, 0,
+    ...                              0, 0, 0, 0,
+    ...                              1, 0, 0, 0,
+    ...                              1, 1, 0, 1])
+    >>> features = FeatureBoard.from_board(board)
+    >>> features.features()
+    Features(height=4, holes=0, bumpiness=3, lines=0, wells=1, row_transitions=8, col_transitions=4)
+    >>> features.place([(2, 3), (1, 2), (2, 2), (3, 2)])
+    2
+    >>> features.features()
+    Features(height=0, holes=0, bumpiness=0, lines=2, wells=0, row_transitions=8, col_transitions=4)
+    """
+
+    __slots__ = ('_num_cols', '_num_rows', '_full', '_masks', '_heights',
+                 '_row_trans', '_col_trans',
+                 '_count', '_bumpiness', '_wells', '_row_trans_sum',
+                 '_col_trans_sum', '_lines')
+
+    def __init__(self, num_cols, num_rows, masks, heights, count):
+        """ Use from_board to make one from a Board
+        """
+        self._num_cols = num_cols
+        self._num_rows = num_rows
+        self._full = (1 << num_cols) - 1
+        self._masks = masks
+        self._heights = heights
+        self._count = count
+        self._lines = 0
+        self._row_trans = [self._row_transitions(mask) for mask in masks]
+        self._row_trans_sum = sum(self._row_trans)
+        self._update_columns()
+
+    @classmethod
+    def from_board(cls, board):
+        """ Returns a FeatureBoard of the cells of board
+        """
+        num_rows = board.get_num_rows()
+        return cls(board.get_num_cols(), num_rows,
+                   [board.get_row_mask(y) for y in range(num_rows)],
+                   board.get_col_heights(), sum(board.get_col_counts()))
+
+# --------------------------------- Open APIs -------------------------------- #
+
+    def get_num_cols(self):
+        return self._num_cols
+
+    def get_num_rows(self):
+        return self._num_rows
+
+    def get_row_mask(self, y):
+        """ As Board.get_row_mask, so movegen can search a FeatureBoard
+        """
+        return self._masks[y]
+
+    def key(self):
+        """ Returns a hashable key of the occupied cells
+        """
+        return tuple(self._masks)
+
+    def copy(self):
+        child = FeatureBoard.__new__(FeatureBoard)
+        child._num_cols = self._num_cols
+        child._num_rows = self._num_rows
+        child._full = self._full
+        child._masks = self._masks[:]
+        child._heights = self._heights[:]
+        child._row_trans = self._row_trans[:]
+        child._col_trans = self._col_trans[:]
+        child._count = self._count
+        child._bumpiness = self._bumpiness
+        child._wells = self._wells
+        child._row_trans_sum = self._row_trans_sum
+        child._col_trans_sum = self._col_trans_sum
+        child._lines = self._lines
+        return child
+
+    def place(self, blocks_pos):
+        """ Fill the cells at blocks_pos and clear the rows that are then
+            full, as a frozen pytromino does. Returns the number of rows
+            cleared, or None when a block is off the board (game over), in
+            which case the features are not updated
+        """
+        num_cols, num_rows = self._num_cols, self._num_rows
+        masks, heights = self._masks, self._heights
+        for x, y in blocks_pos:
+            if not (0 <= x < num_cols and 0 <= y < num_rows):
+                return None
+        rows = set()
+        tops = {}
+        for x, y in blocks_pos:
+            masks[y] |= 1 << x
+            rows.add(y)
+            if num_rows - y > max(heights[x], tops.get(x, 0)):
+                tops[x] = num_rows - y
+        self._count += len(blocks_pos)
+        full_rows = [y for y in rows if masks[y] == self._full]
+        if full_rows:
+            self._clear_rows(full_rows)
+            return self._lines
+        self._lines = 0
+        if tops:
+            self._set_heights(tops)
+        row_trans, col_trans = self._row_trans, self._col_trans
+        for y in rows:
+            row_sum = self._row_transitions(masks[y])
+            self._row_trans_sum += row_sum - row_trans[y]
+            row_trans[y] = row_sum
+        # Boundary y lies between rows y - 1 and y
+        for y in rows | {y + 1 for y in rows}:
+            col_sum = self._col_transitions(y)
+            self._col_trans_sum += col_sum - col_trans[y]
+            col_trans[y] = col_sum
+        return 0
+
+    def features(self):
+        """ Returns the Features of the board, lines being those cleared by
+            the last place()
+        """
+        height = sum(self._heights)
+        return Features(height, height - self._count, self._bumpiness,
+                        self._lines, self._wells, self._row_trans_sum,
+                        self._col_trans_sum)
+
+    def score(self, weights=WEIGHTS):
+        """ Returns the weighted sum of the features
+        """
+        return sum(w * f for w, f in zip(weights, self.features()))
+
+# ----------------------------- Helper Functions ----------------------------- #
+
+    def _row_transitions(self, mask):
+        walled = (mask << 1) | 1 | (1 << (self._num_cols + 1))
+        return bin((walled ^ (walled >> 1))
+                   & ((1 << (self._num_cols + 1)) - 1)).count('1')
+
+    def _col_transitions(self, y):
+        above = self._masks[y - 1] if y > 0 else 0
+        below = self._masks[y] if y < self._num_rows else self._full
+        return bin(above ^ below).count('1')
+
+    def _span(self, lo, hi):
+        """ Returns the bumpiness between and the wells of columns lo to hi
+        """
+        heights, last = self._heights, self._num_cols - 1
+        bumpiness = wells = 0
+        left = heights[lo - 1] if lo > 0 else self._num_rows
+        for x in range(lo, hi + 1):
+            height = heights[x]
+            right = heights[x + 1] if x < last else self._num_rows
+            if x < hi:
+                bumpiness += abs(height - right)
+            lowest = left if left < right else right
+            if lowest > height:
+                wells += lowest - height
+            left = height
+        return bumpiness, wells
+
+    def _set_heights(self, tops):
+        """ Set the height of the columns of tops, updating the bumpiness
+            and the wells of them and their neighbours
+        """
+        lo = max(0, min(tops) - 1)
+        hi = min(self._num_cols - 1, max(tops) + 1)
+        bumpiness, wells = self._span(lo, hi)
+        for x, height in tops.items():
+            self._heights[x] = height
+        new_bumpiness, new_wells = self._span(lo, hi)
+        self._bumpiness += new_bumpiness - bumpiness
+        self._wells += new_wells - wells
+
+    def _clear_rows(self, full_rows):
+        num_cleared = len(full_rows)
+        full_rows = set(full_rows)
+        self._masks = [0] * num_cleared + [
+            mask for y, mask in enumerate(self._masks) if y not in full_rows
+        ]
+        self._row_trans = [
+            self._row_transitions(mask) for mask in self._masks
+        ]
+        self._row_trans_sum = sum(self._row_trans)
+        self._count -= num_cleared * self._num_cols
+        heights = [0] * self._num_cols
+        remaining = self._full
+        for y, mask in enumerate(self._masks):
+            top = mask & remaining
+            while top:
+                bit = top & -top
+                top ^= bit
+                heights[bit.bit_length() - 1] = self._num_rows - y
+            remaining &= ~mask
+            if not remaining:
+                break
+        self._heights = heights
+        self._lines = num_cleared
+        self._update_columns()
+
+    def _update_columns(self):
+        """ Recompute the bumpiness, wells and column transitions
+        """
+        self._bumpiness, self._wells = self._span(0, self._num_cols - 1)
+        self._col_trans = [
+            self._col_transitions(y) for y in range(self._num_rows + 1)
+        ]
+        self._col_trans_sum = sum(self._col_trans)
+
+
+class HeuristicAgent:
+    """ Plays the placement of the current pytromino with the best
+        FeatureBoard score, moving it there along the path movegen found and
+        hard dropping it. Gravity may move the pytromino down between
+        actions, the rest of the path is checked against the board before
+        every action and the placement is searched again when it is off
+
+        An agent for selfplay.py and for PytrisController(agent=...)
+
+    >>> from board import Board
+    >>> from colors import EMPTY
+    >>> from engine import PytrisGame
+    >>> from random import Random
+    >>> from randomizer import UniformRandomizer
+    >>> game = PytrisGame(Board(cell_item=EMPTY),
+    ...                   randomizer=UniformRandomizer(Random(0)))
+    >>> game.start()
+    >>> agent = HeuristicAgent()
+    >>> while game.get_pieces() < 100:
+    ...     _ = game.step(agent.act(game))
+    ...     _ = game.tick()
+    >>> game.is_game_over(), game.get_lines()
+    (False, 37)
+    """
+
+    def __init__(self, rng=None, weights=WEIGHTS):
+        """
+        Parameters
+        ----------
+        rng : random.Random
+            Unused, the agent is deterministic. Taken to match the agents
+            of selfplay.AGENTS
+
+        weights : Features
+            Weight of every feature. Default WEIGHTS
+        """
+        self._weights = weights
+        self._pytromino = None
+        self._target = None
+        self._plan = []
+        self._expected = None
+
+# --------------------------------- Open APIs -------------------------------- #
+
+    def act(self, game):
+        """ Returns the next Action for the current pytromino of game
+        """
+        pytromino = game.get_cur_pytromino()
+        board = game.get_board()
+        if pytromino is not self._pytromino \
+                or not self._follows_plan(pytromino, board):
+            self._pytromino = pytromino
+            self._target, self._plan = None, []
+            decision = self.decide(game)
+            if isinstance(decision, Action):
+                return decision
+            self._plan_moves(pytromino, board, decision)
+        if not self._plan:
+            return Action.HARD_DROP
+        move = self._plan.pop(0)
+        (x, y), rotation = pytromino.get_origin(), pytromino.get_rotation()
+        dx, dy, drot = move.value
+        self._expected = (x + dx, y + dy, (rotation + drot) & 3)
+        return Action[move.name]
+
+    def decide(self, game):
+        """ Returns the movegen.Placement to move the current pytromino of
+            game to, None when there is none, or an Action to step first
+            after which the agent decides again. Subclasses may override it
+            to search further ahead
+        """
+        pytromino = game.get_cur_pytromino()
+        return self.best_placement(game.get_board(), pytromino.get_type(),
+                                   pytromino.get_origin(),
+                                   pytromino.get_rotation())
+
+    def best_placement(self, board, pytromino_type, spawn=(4, 0), rotation=0):
+        """ Returns the movegen.Placement with the best score, None when the
+            pytromino does not fit at spawn
+        """
+        placements = generate_placements(board, pytromino_type, spawn,
+                                         paths=False, rotation=rotation)
+        features = FeatureBoard.from_board(board)
+        best, best_score = None, None
+        for placement in placements:
+            child = features.copy()
+            if child.place(placement.blocks) is None:
+                # Sticks out above the board: only if there is nothing else
+                score = float('-inf')
+            else:
+                score = child.score(self._weights)
+            if best is None or score > best_score:
+                best, best_score = placement, score
+        return best
+
+# ----------------------------- Helper Functions ----------------------------- #
+
+    def _plan_moves(self, pytromino, board, best):
+        """ Plan the moves to placement best from where pytromino is
+        """
+        spawn, rotation = pytromino.get_origin(), pytromino.get_rotation()
+        self._expected = spawn + (rotation,)
+        if best is None:
+            return
+        # The placements are found without their paths, trace only the best
+        path = find_path(board, best, spawn, rotation)
+        if path is None:
+            return
+        path = list(path)
+        # The hard drop does the last moves down
+        while path and path[-1] is Move.DOWN:
+            path.pop()
+        self._target = best.blocks
+        self._plan = path
+
+    def _follows_plan(self, pytromino, board):
+        """ Whether the rest of the plan still takes pytromino to the
+            target. The moves down that gravity did in the meantime are taken
+            off the plan
+        """
+        if self._target is None:
+            return False
+        plan = self._plan
+        (x, y), rotation = pytromino.get_origin(), pytromino.get_rotation()
+        shape = pytromino.get_shape()
+        ex, ey, expected_rotation = self._expected
+        if x != ex or y < ey or rotation != expected_rotation:
+            return False
+        for _ in range(y - ey):
+            if Move.DOWN in plan:
+                plan.remove(Move.DOWN)
+        for move in plan:
+            dx, dy, drot = move.value
+            offsets = shape.rotations[(rotation + drot) & 3]
+            if not board.fits_at(offsets, x + dx, y + dy):
+                return False
+            x, y, rotation = x + dx, y + dy, (rotation + drot) & 3
+        blocks = [(x + dx, y + dy) for dx, dy in shape.rotations[rotation]]
+        distance = board.drop_distance(blocks)
+        return tuple(sorted((bx, by + distance) for bx, by in blocks)) \
+            == self._target
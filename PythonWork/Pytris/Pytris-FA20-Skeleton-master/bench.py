@@ -0,0 +1,353 @@
+""" Benchmarks of the Pytris hot paths, to show whether a change made them
+    faster or slower.
+
+    Every benchmark reports the best, over a few repeats, of the mean time
+    per call. Results are written to a JSON file and compared with a
+    baseline, by default bench_baseline.json next to this file, failing when
+    one is slower by more than the threshold. Baselines only compare on the
+    same machine, refresh it with --save-baseline before making a change.
+
+    python bench.py                          # run all, compare to baseline
+    python bench.py board --threshold 0.1    # only names containing board
+    python bench.py --save-baseline --runs 3 # write a new baseline
+
+    Drawing is timed against the SDL dummy video driver, so no window opens.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from board import Board
+from colors import EMPTY, Color
+from engine import Action
+from models import Pytromino, pytromino_factory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'bench_baseline.json')
+
+SIZES = [(10, 20), (20, 40), (40, 80), (10, 200)]
+
+
+def measure(fn, setup=None, min_time=0.05, repeat=5):
+    """ Returns the best over repeat runs of the mean seconds per call of
+        fn, each run calling it for at least min_time seconds. When given,
+        setup() is called untimed before every call and its result passed
+        to fn
+    """
+    perf_counter = time.perf_counter
+    best = None
+    for _ in range(repeat):
+        calls, total = 0, 0.0
+        while total < min_time:
+            if setup is None:
+                start = perf_counter()
+                for _ in range(100):
+                    fn()
+                total += perf_counter() - start
+                calls += 100
+            else:
+                arg = setup()
+                start = perf_counter()
+                fn(arg)
+                total += perf_counter() - start
+                calls += 1
+        mean = total / calls
+        if best is None or mean < best:
+            best = mean
+    return best
+
+
+# ---------------------------------- Board ----------------------------------- #
+
+def _backends():
+    backends = ['list', 'bitboard']
+    if np is not None:
+        backends.append('numpy')
+    return backends
+
+
+def _scripted_board(backend, num_cols, num_rows, seed=0):
+    """ Returns a board with its lower half filled in a fixed pattern, no
+        row of it full
+    """
+    board = Board(num_cols, num_rows, EMPTY, backend=backend,
+                  compact=backend != 'numpy')
+    for y in range(num_rows // 2, num_rows):
+        for x in range(num_cols):
+            if (x * 7 + y * 3 + seed) % 5 and x != y % num_cols:
+                board[(x, y)] = Color.BLUE.index
+    return board
+
+
+def _insert_delete(board, row, calls=500, repeat=5):
+    """ Returns the seconds per call of insert_row_at and delete_row, timed
+        one after the other so that the board keeps its size
+    """
+    perf_counter = time.perf_counter
+    best_insert = best_delete = None
+    for _ in range(repeat):
+        insert = delete = 0.0
+        for _ in range(calls):
+            start = perf_counter()
+            board.insert_row_at(0, row)
+            middle = perf_counter()
+            board.delete_row(0)
+            insert += middle - start
+            delete += perf_counter() - middle
+        if best_insert is None or insert < best_insert:
+            best_insert = insert
+        if best_delete is None or delete < best_delete:
+            best_delete = delete
+    return best_insert / calls, best_delete / calls
+
+
+def _keep_all(name):
+    return True
+
+
+def _clear_rows(board, num_full=4):
+    """ Returns the seconds per clear of the num_full bottom rows of board,
+        each on a fork of it with these rows full
+    """
+    full = range(board.get_num_rows() - num_full, board.get_num_rows())
+    for y in full:
+        for x in range(board.get_num_cols()):
+            board[(x, y)] = Color.BLUE.index
+    return measure(lambda fork: fork.clear_rows(full), board.fork,
+                   min_time=0.02)
+
+
+def bench_board(keep=_keep_all):
+    results = {}
+    for backend in _backends():
+        for num_cols, num_rows in SIZES:
+            tag = f'[{backend} {num_cols}x{num_rows}]'
+            names = [f'board.{method}{tag}' for method in
+                     ('get_col', 'get_row', 'insert_row_at', 'delete_row',
+                      'clear_rows')]
+            if not any(map(keep, names)):
+                continue
+            board = _scripted_board(backend, num_cols, num_rows)
+            x, y = num_cols // 2, num_rows - 1
+            if keep(names[0]):
+                results[names[0]] = measure(lambda: board.get_col(x))
+            if keep(names[1]):
+                results[names[1]] = measure(lambda: board.get_row(y))
+            if keep(names[2]) or keep(names[3]):
+                insert, delete = _insert_delete(board, board.get_row(y))
+                for name, result in zip(names[2:4], (insert, delete)):
+                    if keep(name):
+                        results[name] = result
+            if keep(names[4]):
+                results[names[4]] = _clear_rows(board)
+    return results
+
+
+# -------------------------------- Pytromino --------------------------------- #
+
+def bench_pytromino(keep=_keep_all):
+    results = {}
+    board = Board(cell_item=EMPTY, backend='bitboard', compact=True)
+    for pytromino_t in (Pytromino.Types.T, Pytromino.Types.I):
+        tag = f'[{pytromino_t.name}]'
+        pytromino = pytromino_factory(pytromino_t)
+        pytromino.place_at((4, 4))
+        right, left = Pytromino.shift_right_fn(1), Pytromino.shift_left_fn(1)
+        rotate = pytromino.rotate_block_90_cw
+
+        def shift():
+            pytromino.validated_apply(right)
+            pytromino.validated_apply(left)
+
+        def try_move():
+            pytromino.try_move(1, 0, 0, board)
+            pytromino.try_move(-1, 0, 1, board)
+        # (name, fn, number of calls fn makes)
+        for name, fn, calls in (
+            ('pytromino.validated_apply.shift', shift, 2),
+            ('pytromino.validated_apply.rotate',
+             lambda: pytromino.validated_apply(rotate, True), 1),
+            ('pytromino.rotate_block_90_cw', lambda: rotate((1, 0)), 1),
+            ('pytromino.try_move', try_move, 2),
+        ):
+            if keep(name + tag):
+                results[name + tag] = measure(fn) / calls
+    return results
+
+
+# ------------------------------- Controller --------------------------------- #
+
+def _controller(board, coalesce=False):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from game_ctl import PytrisController
+    from view import PytrisViewManager
+    pygame.init()
+    gui = PytrisViewManager(pygame, board.get_num_cols(),
+                            board.get_num_rows(), coalesce=coalesce)
+    controller = PytrisController(board, gui, a=0)
+    gui.init_window()
+    return controller, gui
+
+
+def bench_controller(keep=_keep_all):
+    """ The row clearance of the controller, finding the full rows, clearing
+        them and redrawing, and frames drawn to the dummy video driver, with
+        a display update per draw or one per frame when coalesced. pygame is
+        only started when one of them is kept
+    """
+    results = {}
+    for backend in _backends():
+        clear_names = {num_full: f'controller.row_clear[{backend} {num_full}]'
+                       for num_full in (1, 4)}
+        full_name = f'controller.frame.full[{backend}]'
+        move_name = f'controller.frame.move[{backend}]'
+        coalesced_name = f'controller.frame.move.coalesced[{backend}]'
+        if any(map(keep, [*clear_names.values(), full_name, move_name])):
+            board = _scripted_board(backend, 10, 20)
+            controller, gui = _controller(board)
+            for num_full, name in clear_names.items():
+                if not keep(name):
+                    continue
+                full = range(20 - num_full, 20)
+
+                def setup():
+                    for y in range(10, 20):
+                        for x in range(10):
+                            filled = y in full or ((x * 7 + y * 3) % 5
+                                                   and x != y % 10)
+                            board[(x, y)] = Color.BLUE.index if filled \
+                                else EMPTY
+                    board.flush_dirty()
+                    return full
+
+                def clear(rows):
+                    cleared = board.full_rows(rows)
+                    controller.on_clearing(cleared)
+                    board.clear_rows(cleared)
+                    controller.on_clear(cleared)
+                results[name] = measure(clear, setup, min_time=0.02)
+            game = controller.get_game()
+            game.start()
+
+            def frame():
+                gui.init_window()
+                for y in range(20):
+                    for x in range(10):
+                        gui.draw_rectangle_in_main((x, y), board[(x, y)])
+                controller.on_nextup()
+                gui.render()
+            if keep(full_name):
+                results[full_name] = measure(frame, min_time=0.1)
+
+            def move_frame():
+                game.step(Action.LEFT)
+                game.step(Action.RIGHT)
+            if keep(move_name):
+                results[move_name] = measure(move_frame) / 2
+
+        if keep(coalesced_name):
+            controller, gui = _controller(_scripted_board(backend, 10, 20),
+                                          coalesce=True)
+            game = controller.get_game()
+            game.start()
+
+            def coalesced_move_frame():
+                game.step(Action.LEFT)
+                game.step(Action.RIGHT)
+                gui.flush()
+            results[coalesced_name] = measure(coalesced_move_frame) / 2
+    return results
+
+
+BENCHES = {
+    'board': bench_board,
+    'pytromino': bench_pytromino,
+    'controller': bench_controller,
+}
+
+
+def compare(results, baseline, threshold):
+    """ Returns the rows of (name, baseline, result, ratio, regressed) of
+        the benchmarks in both, regressed when result > baseline by more
+        than threshold, e.g. 0.25 for 25%
+
+    >>> compare({'a': 2.0, 'b': 1.0}, {'a': 1.0, 'b': 1.0, 'c': 1.0}, 0.25)
+    [('a', 1.0, 2.0, 2.0, True), ('b', 1.0, 1.0, 1.0, False)]
+    """
+    rows = []
+    for name, result in results.items():
+        if name in baseline:
+            ratio = result / baseline[name]
+            rows.append((name, baseline[name], result, ratio,
+                         ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Pytris')
+    parser.add_argument('filter', nargs='?', default='',
+                        help='only keep the benchmarks whose name contains '
+                             'this')
+    parser.add_argument('--out', default='bench.json',
+                        help='JSON file for the results (default: bench.json)')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='JSON file of results to compare to '
+                             '(default: bench_baseline.json)')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fail when slower than the baseline by more '
+                             'than this fraction (default: 0.25)')
+    parser.add_argument('--runs', type=int, default=1,
+                        help='run everything this many times and keep the '
+                             'median of every benchmark, steadier on a '
+                             'busy machine (default: 1)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write the results to the baseline instead')
+    args = parser.parse_args(argv)
+
+    def keep(name):
+        return args.filter in name
+
+    runs = {}
+    for _ in range(args.runs):
+        for bench in BENCHES.values():
+            for name, result in bench(keep).items():
+                runs.setdefault(name, []).append(result)
+    results = {name: statistics.median(run) for name, run in runs.items()}
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'numpy': np.__version__ if np is not None else None,
+        'results': results,
+    }
+    out = args.baseline if args.save_baseline else args.out
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    if args.save_baseline or not os.path.exists(args.baseline):
+        for name, result in results.items():
+            print(f'{name:<48} {result * 1e6:10.2f} us')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    rows = compare(results, baseline, args.threshold)
+    for name, base, result, ratio, regressed in rows:
+        print(f'{name:<48} {base * 1e6:10.2f} {result * 1e6:10.2f} us '
+              f'{ratio:6.2f}x{"  REGRESSION" if regressed else ""}')
+    regressions = sum(row[-1] for row in rows)
+    print(f'{len(rows)} compared, {regressions} slower than the baseline by '
+          f'more than {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,30 @@
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import chain
+from zobrist import zobrist_key, row_key
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
 class Board:
     """ An object to represent a 2-Dimensional rectangular board
     """
 
-    def __init__(self, num_cols=10, num_rows=20, cell_item=None, grid=None):
+    def __new__(cls, *args, backend='list', **kwargs):
+        """ Board(..., backend=name) creates an instance of the Board
+            subclass registered under name in _BACKENDS
+        """
+        if cls is Board:
+            cls = _select_backend(backend)
+        return super().__new__(cls)
+
+    def __init__(self, num_cols=10, num_rows=20, cell_item=None, grid=None,
+                 backend='list', compact=False, hashing=False):
         """ Create a Board instance that has num cols and num rows.
-            The 2D board is represented with a single list, if the board looks like:
+            The 2D board is represented with a list of rows, if the board looks like:
             
             col  col  col
              0   1    2
@@ -17,7 +37,11 @@ class Board:
             Where num cols = 3, num rows = 2
             
             Then the underlying representation looks like:
-            [0, 1, 2, 3, 4, 5]
+            [[0, 1, 2], [3, 4, 5]]
+
+            Cells are still numbered in row major order, so index 4 is (1, 1).
+            Deleting or inserting a row only moves row references, the cells
+            of the other rows are never copied.
 
         Parameters
         ----------
@@ -32,18 +56,47 @@ class Board:
         
         grid (list[any], optional): a list to create the underlying board representation.
                 However len(grid) = num_cols * num_rows. Defaults to None.
+
+        backend (str, optional): storage backend, one of the keys of _BACKENDS.
+                'list' keeps the list of rows described above, 'bitboard' adds
+                an integer occupancy mask per row (see BitBoard), 'numpy'
+                stores palette indices in a 2-D array (see NumpyBoard,
+                requires numpy). Defaults to 'list'.
+
+        compact (bool, optional): store every row as a bytearray instead of
+                a list. All items must then be ints in range(256), such as
+                palette indices (see colors.make_palette). Defaults to False.
+
+        hashing (bool, optional): keep the Zobrist hash of the board up to
+                date on every write and row move, see zobrist_hash. Else it
+                is computed on request. Defaults to False.
+
+        >>> board = Board(3, 1, 0, compact=True)
+        >>> board.set_item(1, 0, 9)
+        >>> board.get_row(0), board.get_col_heights()
+        ([0, 9, 0], [0, 1, 0])
         """
         assert num_cols is not None and num_rows is not None
         assert type(num_cols) == int and type(num_rows) == int
         assert num_cols >= 0 and num_rows >= 0
         self._num_rows = num_rows
         self._num_cols = num_cols
+        self._empty = cell_item
+        self._row_type = bytearray if compact else list
+        self._hashing = hashing
+        # _cell_keys[x][item] is the Zobrist key of item in column x, 0 for
+        # the empty item, filled in on first use
+        self._cell_keys = [_CellKeys(x, cell_item) for x in range(num_cols)]
         if grid:
             assert num_cols * num_rows == len(grid)
-            self._grid = grid[:]
+            self._rows = [self._row_type(grid[y * num_cols : (y + 1) * num_cols])
+                          for y in range(num_rows)]
         else:
-            self._grid = [cell_item for _ in range(num_cols * num_rows)]
-
+            self._rows = [self._row_type([cell_item] * num_cols)
+                          for _ in range(num_rows)]
+        # _owned[y] is False while row y is shared with a fork
+        self._owned = [True] * num_rows
+        self._track_reset()
 
 
 # ---------------------------------------------------------------------------- #
@@ -80,10 +133,7 @@ class Board:
         >>> board2.get_col(0)
         [1, 4]
         """
-        copy = []
-        for i in range(0, self._num_rows):
-            copy.insert(i, self._grid[x + i*self._num_cols])
-        return(copy)
+        return [row[x] for row in self._rows]
 
     def get_item(self, x, y):
         """Get the item at coordinate (x, y)
@@ -116,7 +166,7 @@ class Board:
         >>> [board2.get_item(x, y) for y in range(1) for x in range(4)]
         [9, 2, 4, 1]
         """
-        return(self._grid[(y * self._num_cols) + x])
+        return self._rows[y][x]
 
     def set_item(self, x, y, item):
         """Overwrite the item at (x, y)
@@ -144,7 +194,9 @@ class Board:
         30 4 5
         =====
         """
-        self._grid[(y * self._num_cols) + x] = item
+        row = self._rows[y] if self._owned[y] else self._own_row(y)
+        self._track_write(x, y, row[x], item)
+        row[x] = item
 
     def insert_row_at(self, y, lst):
         """Insert lst as new row at row y. Increment num_rows by 1
@@ -172,8 +224,9 @@ class Board:
         3
         """
         self._num_rows += 1 # DO NOT touch this line
-        for i in range(0, len(lst)):
-            self._grid.insert(y*self._num_cols+i, lst[i])
+        self._rows.insert(y, self._row_type(lst))
+        self._owned.insert(y, True)
+        self._track_insert_row(y)
 
     def valid_coordinate(self, coordinate):
         """Check if coordinate (x, y) is within the board
@@ -245,8 +298,7 @@ class Board:
         [3, 4, 5]
         """
         assert 0 <= y < self._num_rows, f'Invalid y: {y}'
-        start_index = y * self._num_cols
-        return self._grid[start_index : start_index + self._num_cols]
+        return list(self._rows[y])
 
     def delete_row(self, y):
         """Delete row y and decremet num_rows count by 1
@@ -272,9 +324,38 @@ class Board:
         >>> board.get_num_rows()
         2
         """
-        index_start = y * self._num_cols
-        del self._grid[index_start : index_start + self._num_cols]
+        removed = self._rows.pop(y)
+        del self._owned[y]
         self._num_rows -= 1
+        self._track_delete_row(y, removed)
+
+    def delete_rows(self, rows):
+        """Delete all rows in rows, decrementing num_rows once per row
+
+        >>> board = Board(2, 3, grid=list(range(6)))
+        >>> board.delete_rows([0, 2])
+        >>> print(board)
+        ===
+        2 3
+        ===
+        """
+        for y in sorted(set(rows), reverse=True):
+            self.delete_row(y)
+
+    def insert_rows_at(self, y, rows):
+        """Insert a list of rows so that the first one becomes row y
+
+        >>> board = Board(2, 1, grid=[0, 1])
+        >>> board.insert_rows_at(0, [[2, 3], [4, 5]])
+        >>> print(board)
+        ===
+        2 3
+        4 5
+        0 1
+        ===
+        """
+        for lst in reversed(rows):
+            self.insert_row_at(y, lst)
 
     def index_to_coordinate(self, index):
         """Convert an index to (x, y) coordinate
@@ -298,7 +379,7 @@ class Board:
         >>> board.index_to_coordinate(5)
         (2, 1)
         """
-        assert 0 <= index < len(self._grid), f'Invalid index: {index}'
+        assert 0 <= index < len(self), f'Invalid index: {index}'
         return (index % self._num_cols, index // self._num_cols)
 
     def filter_coordinates(self, fn):
@@ -319,14 +400,330 @@ class Board:
         >>> board.filter_coordinates(lambda x: x % 2 == 1)
         [(1, 0), (0, 1), (2, 1), (1, 2)]
         """
-        return [(i % self._num_cols, i // self._num_cols) \
-                    for i, item in enumerate(self._grid) if fn(item)]
+        return [(x, y) for y, row in enumerate(self._rows)
+                    for x, item in enumerate(row) if fn(item)]
         
+    def is_free(self, coordinate):
+        """Check if coordinate (x, y) is within the board and holds
+            the empty item (cell_item)
+
+        >>> board = Board(2, 2, 0, grid=[0, 1, 0, 0])
+        >>> board.is_free((0, 0)), board.is_free((1, 0)), board.is_free((2, 0))
+        (True, False, False)
+        """
+        return self.valid_coordinate(coordinate) \
+            and self.get_item(coordinate[0], coordinate[1]) == self._empty
+
+    def fits(self, coordinates):
+        """Check if every coordinate is free. Coordinates above the board
+            (y < 0) are accepted as long as they are within the columns
+
+        >>> board = Board(3, 2, 0, grid=[0, 0, 0, 0, 1, 0])
+        >>> board.fits([(0, -1), (0, 0), (0, 1)])
+        True
+        >>> board.fits([(1, 0), (1, 1)])
+        False
+        >>> board.fits([(3, -1)])
+        False
+        """
+        for pos in coordinates:
+            if pos[1] < 0:
+                if not 0 <= pos[0] < self._num_cols:
+                    return False
+            elif not self.is_free(pos):
+                return False
+        return True
+
+    def drop_distance(self, coordinates):
+        """Get how many rows coordinates can be shifted down while still
+            fitting (see fits). The landing row of each column is read from
+            the column heights, and only coordinates below the top of their
+            column (under an overhang) scan down for the next filled cell.
+            coordinates are expected to fit
+
+        >>> board = Board(3, 4, 0, grid=[0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 1, 0])
+        >>> board.drop_distance([(0, 0), (1, -1)])
+        1
+        >>> board.drop_distance([(0, 0), (2, 0)])
+        2
+        >>> board.drop_distance([(1, 2), (2, 2)])
+        0
+        >>> board.drop_distance([(0, 2)]), board.drop_distance([(1, 0)])
+        (0, 0)
+        >>> board.drop_distance([(2, -2)])
+        5
+        """
+        num_rows = self._num_rows
+        distance = None
+        for x, y in coordinates:
+            top = num_rows - self.get_col_height(x)
+            if y < top:
+                steps = top - 1 - y
+            else:
+                steps = 0
+                while self.is_free((x, y + steps + 1)):
+                    steps += 1
+            if distance is None or steps < distance:
+                distance = steps
+        return distance or 0
+
+    def fits_at(self, offsets, x, y):
+        """Check if offsets shifted by (x, y) fit, with the same rules as
+            fits, without building the shifted coordinates
+
+        >>> board = Board(3, 2, 0, grid=[0, 0, 0, 0, 1, 0])
+        >>> board.fits_at(((0, 0), (0, -1)), 1, 0)
+        True
+        >>> board.fits_at(((0, 0), (0, 1)), 1, 0)
+        False
+        """
+        num_cols, num_rows = self._num_cols, self._num_rows
+        rows, empty = self._rows, self._empty
+        for dx, dy in offsets:
+            cx, cy = x + dx, y + dy
+            if not 0 <= cx < num_cols or cy >= num_rows:
+                return False
+            if cy >= 0 and rows[cy][cx] != empty:
+                return False
+        return True
+
+    def is_row_full(self, y):
+        """Check if row y holds no empty item
+
+        >>> board = Board(2, 2, 0, grid=[1, 1, 0, 1])
+        >>> board.is_row_full(0), board.is_row_full(1)
+        (True, False)
+        """
+        return self._row_counts[y] == self._num_cols
+
+    def full_rows(self, rows=None):
+        """Get the full rows among rows (all rows by default) in ascending
+            order. Rows outside of the board are ignored
+
+        >>> board = Board(2, 3, 0, grid=[1, 1, 0, 1, 1, 1])
+        >>> board.full_rows()
+        [0, 2]
+        >>> board.full_rows([-1, 1, 2])
+        [2]
+        """
+        if rows is None:
+            rows = range(self._num_rows)
+        return sorted(y for y in set(rows)
+                      if 0 <= y < self._num_rows and self.is_row_full(y))
+
+    def clear_rows(self, rows):
+        """Delete rows and add as many empty rows (filled with cell_item)
+            to the top of the board. Only row references are moved, the
+            cells of the remaining rows are not copied, and only the cleared
+            rows are visited
+
+        Returns
+        -------
+        int:
+            number of rows cleared
+
+        >>> board = Board(2, 3, 0, grid=[1, 0, 2, 2, 3, 3])
+        >>> board.clear_rows([1, 2])
+        2
+        >>> print(board)
+        ===
+        0 0
+        0 0
+        1 0
+        ===
+        """
+        rows = sorted(set(rows))
+        if not rows:
+            return 0
+        assert 0 <= rows[0] and rows[-1] < self._num_rows, \
+            f'Invalid rows: {rows}'
+        removed = [self._rows[y] for y in rows]
+        for y in reversed(rows):
+            del self._rows[y]
+            del self._owned[y]
+        self._rows[:0] = [self._row_type([self._empty] * self._num_cols)
+                          for _ in rows]
+        self._owned[:0] = [True] * len(rows)
+        self._track_clear_rows(rows, removed)
+        return len(rows)
+
     def update_grid(self, new_grid):
         """ Overwrite existing underlying board with a new board
         """
-        assert len(new_grid) == len(self._grid), 'unequal grid lengths'
-        self._grid = new_grid
+        assert len(new_grid) == len(self), 'unequal grid lengths'
+        cols = self._num_cols
+        self._rows = [self._row_type(new_grid[y * cols : (y + 1) * cols])
+                      for y in range(self._num_rows)]
+        self._owned = [True] * self._num_rows
+        self._track_reset()
+        self._mark_moved_rows(0, self._num_rows)
+
+    def fork(self):
+        """ Create a copy of this board that shares its rows with this board.
+            A shared row is only copied by whichever board writes to it
+            first, so forking costs O(num_rows) and not O(num_cells)
+
+        >>> board = Board(2, 2, 0, grid=[0, 1, 2, 3])
+        >>> child = board.fork()
+        >>> child.set_item(0, 1, 7)
+        >>> board.set_item(1, 0, 8)
+        >>> print(board)
+        ===
+        0 8
+        2 3
+        ===
+        >>> print(child)
+        ===
+        0 1
+        7 3
+        ===
+        >>> child.get_row_counts(), board.get_row_counts()
+        ([1, 2], [1, 2])
+        """
+        child = object.__new__(type(self))
+        child.__dict__ = self.__dict__.copy()
+        child._rows = self._rows[:]
+        child._row_counts = self._row_counts[:]
+        child._col_counts = self._col_counts[:]
+        child._col_tops = self._col_tops[:]
+        if self._hashing:
+            child._row_hashes = self._row_hashes[:]
+        child._dirty_cells = set(self._dirty_cells)
+        self._owned = [False] * self._num_rows
+        child._owned = self._owned[:]
+        return child
+
+    def _own_row(self, y):
+        """ Replace the shared row y with a private copy and return it
+        """
+        row = self._rows[y] = self._rows[y][:]
+        self._owned[y] = True
+        return row
+
+    def get_row_count(self, y):
+        """ Returns the number of filled (not empty) cells in row y
+        """
+        return self._row_counts[y]
+
+    def get_col_count(self, x):
+        """ Returns the number of filled (not empty) cells in column x
+        """
+        return self._col_counts[x]
+
+    def get_col_height(self, x):
+        """ Returns the height of column x, i.e. num_rows minus the row of
+            its topmost filled cell, 0 for an empty column
+        """
+        return self._num_rows - self._col_tops[x]
+
+    def get_row_mask(self, y):
+        """ Returns the occupancy mask of row y: bit x is set when cell (x, y)
+            is filled
+
+        >>> Board(3, 1, 0, grid=[1, 0, 1]).get_row_mask(0)
+        5
+        """
+        mask = 0
+        for x, item in enumerate(self._rows[y]):
+            if item != self._empty:
+                mask |= 1 << x
+        return mask
+
+    def get_row_counts(self):
+        """ Returns a COPY of the filled cell count of every row
+
+        >>> board = Board(3, 3, 0, grid=[0, 0, 0, 0, 2, 0, 1, 0, 1])
+        >>> board.get_row_counts(), board.get_col_counts()
+        ([0, 1, 2], [1, 1, 1])
+        >>> board.get_col_heights()
+        [1, 2, 1]
+        >>> board[(1, 1)] = 0
+        >>> board.get_col_heights(), board.get_row_counts()
+        ([1, 0, 1], [0, 0, 2])
+        >>> board.insert_row_at(0, [0, 0, 3])
+        >>> board.get_col_heights(), board.get_row_counts()
+        ([1, 0, 4], [1, 0, 0, 2])
+        >>> board.delete_row(3)
+        >>> board.get_col_heights(), board.get_col_counts()
+        ([0, 0, 3], [0, 0, 1])
+        """
+        return self._row_counts[:]
+
+    def get_col_counts(self):
+        """ Returns a COPY of the filled cell count of every column
+        """
+        return self._col_counts[:]
+
+    def get_col_heights(self):
+        """ Returns a list of the height of every column
+        """
+        return [self._num_rows - top for top in self._col_tops]
+
+    def row_view(self, y):
+        """ Returns a read-only view of row y that reads through to this
+            board instead of copying it
+        """
+        assert 0 <= y < self._num_rows, f'Invalid y: {y}'
+        return RowView(self, y)
+
+    def col_view(self, x):
+        """ Returns a read-only view of column x that reads through to this
+            board instead of copying it
+        """
+        assert 0 <= x < self._num_cols, f'Invalid x: {x}'
+        return ColumnView(self, x)
+
+    def grid_view(self):
+        """ Returns a read-only view of the whole grid in row major order
+            that reads through to this board instead of copying it
+
+        >>> board = Board(2, 2, grid=list(range(4)))
+        >>> grid, row, col = board.grid_view(), board.row_view(1), board.col_view(0)
+        >>> list(grid), list(row), list(col)
+        ([0, 1, 2, 3], [2, 3], [0, 2])
+        >>> board.set_item(0, 1, 9)
+        >>> grid[2], grid[(0, 1)], row[0], col[-1], 9 in col
+        (9, 9, 9, 9, True)
+        >>> row[0] = 5
+        Traceback (most recent call last):
+        ...
+        TypeError: Board views are read-only
+        """
+        return GridView(self)
+
+    def zobrist_hash(self):
+        """ Returns the 64-bit Zobrist hash of the items on this board, equal
+            for equal boards however they were reached. With hashing it is
+            updated incrementally on every write and recombined from the row
+            hashes on the first call after rows moved, without it is
+            computed from the rows, O(num_cells)
+
+        >>> a = Board(2, 2, 0, hashing=True)
+        >>> b = Board(2, 2, 0, grid=[0, 0, 5, 0], hashing=True)
+        >>> a.zobrist_hash()
+        0
+        >>> a.insert_row_at(2, [5, 0])
+        >>> a.delete_row(0)
+        >>> a.zobrist_hash() == b.zobrist_hash() != 0
+        True
+        >>> b.set_item(1, 1, 6)
+        >>> b.clear_rows([1])
+        1
+        >>> b.zobrist_hash()
+        0
+        >>> Board(2, 2, 0, grid=[0, 0, 5, 0]).zobrist_hash() == a.zobrist_hash()
+        True
+        """
+        if not self._hashing:
+            return _combine_row_hashes(map(self._hash_row, self._rows))
+        if self._hash is None:
+            self._hash = _combine_row_hashes(self._row_hashes)
+        return self._hash
+
+    def get_empty_item(self):
+        """ Returns the item that marks an empty cell (cell_item)
+        """
+        return self._empty
 
     def get_num_rows(self):
         return self._num_rows
@@ -337,7 +734,7 @@ class Board:
     def get_grid(self):
         """ Returns a COPY of the underlying grid
         """
-        return self._grid[:]
+        return [item for row in self._rows for item in row]
 
     def __contains__(self, item):
         """ Returns True if item is in this Board, False otherwise
@@ -348,7 +745,7 @@ class Board:
         >>> 6 in board
         False
         """
-        return self._grid.__contains__(item)
+        return any(item in row for row in self._rows)
 
     def __getitem__(self, key):
         """ Using bracket notation e.g. [, ] and pass in either a number
@@ -359,7 +756,8 @@ class Board:
         True
         """
         if isinstance(key, int):
-            return self._grid[key]
+            y, x = divmod(key, self._num_cols)
+            return self._rows[y][x]
         return self.get_item(key[0], key[1])
 
     def __setitem__(self, key, value):
@@ -372,7 +770,8 @@ class Board:
         70
         """
         if isinstance(key, int):
-            self._grid[key] = value
+            y, x = divmod(key, self._num_cols)
+            self.set_item(x, y, value)
         else:
             self.set_item(key[0], key[1], value)
 
@@ -383,7 +782,7 @@ class Board:
         >>> list(board)
         [0, 1, 2, 3]
         """
-        return self._grid.__iter__()
+        return chain.from_iterable(self._rows)
 
     def __reversed__(self):
         """ Iterate through the underlying grid in reverse row major order
@@ -393,7 +792,7 @@ class Board:
         >>> list(reversed(board))
         [3, 2, 1, 0]
         """
-        return self._grid.__reversed__()
+        return (item for row in reversed(self._rows) for item in reversed(row))
 
     def __len__(self):
         """ Returns the total number of elements
@@ -402,11 +801,244 @@ class Board:
         >>> len(board)
         9
         """
-        return self._grid.__len__()
+        return self._num_cols * self._num_rows
 
     def __repr__(self):
         return f'<Board num_cols: {self._num_cols} num_rows: {self._num_rows}>'
 
+# ---------------------------------------------------------------------------- #
+# -------------------------------- Bookkeeping ------------------------------- #
+# ---------------------------------------------------------------------------- #
+
+    # Every mutation of the rows is reported to one of the _track_* methods,
+    # which keep the filled cell counters below up to date:
+    #   _row_counts[y]: filled cells in row y
+    #   _col_counts[x]: filled cells in column x
+    #   _col_tops[x]:   row of the topmost filled cell in column x,
+    #                   num_rows if the column is empty
+    #   _top:           row of the topmost filled cell, num_rows if the
+    #                   board is empty
+    # as well as, with hashing, the Zobrist hash of the board:
+    #   _row_hashes[y]: XOR of _cell_keys[x][item] over the cells of row y,
+    #                   independent of y, None without hashing
+    #   _hash:          XOR of row_key(_row_hashes[y], y) over all rows,
+    #                   None when rows moved since it was last combined
+    # and what changed since the last flush_dirty():
+    #   _dirty_cells:   coordinates of overwritten cells
+    #   _dirty_from, _dirty_to: the span of rows whose content moved, a
+    #                   row shift widens it instead of marking cells,
+    #                   skipping the rows above the stack before and after
+    #                   the shift. Empty when _dirty_from >= _dirty_to
+
+    def _track_reset(self):
+        """ Recount everything from the rows
+        """
+        empty = self._empty
+        self._row_counts = [sum(item != empty for item in row)
+                            for row in self._rows]
+        self._row_hashes = [self._hash_row(row) for row in self._rows] \
+            if self._hashing else None
+        self._hash = None
+        self._dirty_cells = set()
+        self._dirty_from, self._dirty_to = self._num_rows, 0
+        self._col_counts = [0] * self._num_cols
+        self._col_tops = [self._num_rows] * self._num_cols
+        for y in reversed(range(self._num_rows)):
+            for x, item in enumerate(self._rows[y]):
+                if item != empty:
+                    self._col_counts[x] += 1
+                    self._col_tops[x] = y
+        self._top = self._scan_top(0)
+
+    def _track_write(self, x, y, old, new):
+        """ Called before cell (x, y) is overwritten
+        """
+        if old == new:
+            return
+        if self._hashing:
+            keys = self._cell_keys[x]
+            old_row_hash = self._row_hashes[y]
+            new_row_hash = self._row_hashes[y] = \
+                old_row_hash ^ keys[old] ^ keys[new]
+            if self._hash is not None:
+                self._hash ^= row_key(old_row_hash, y) ^ \
+                    row_key(new_row_hash, y)
+        was_filled = old != self._empty
+        is_filled = new != self._empty
+        self._dirty_cells.add((x, y))
+        if was_filled == is_filled:
+            return
+        if was_filled:
+            self._row_counts[y] -= 1
+            self._col_counts[x] -= 1
+            if self._col_tops[x] == y:
+                self._col_tops[x] = self._find_top(x, y + 1)
+            if self._top == y and not self._row_counts[y]:
+                self._top = self._scan_top(y + 1)
+        else:
+            self._row_counts[y] += 1
+            self._col_counts[x] += 1
+            if y < self._col_tops[x]:
+                self._col_tops[x] = y
+            if y < self._top:
+                self._top = y
+
+    def _track_insert_row(self, y):
+        """ Called after a row has been inserted at y
+        """
+        empty = self._empty
+        row = self._rows[y]
+        old_top = self._top
+        self._row_counts.insert(y, sum(item != empty for item in row))
+        if self._hashing:
+            self._row_hashes.insert(y, self._hash_row(row))
+            self._hash = None
+        tops = self._col_tops
+        for x, item in enumerate(row):
+            if tops[x] >= y:
+                tops[x] += 1
+            if item != empty:
+                self._col_counts[x] += 1
+                if y < tops[x]:
+                    tops[x] = y
+        if self._top >= y:
+            self._top += 1
+        if self._row_counts[y] and y < self._top:
+            self._top = y
+        self._mark_moved_rows(max(y, min(old_top, self._top)),
+                              self._num_rows)
+
+    def _track_delete_row(self, y, removed):
+        """ Called after row y, holding the items in removed, has been deleted
+        """
+        empty = self._empty
+        old_top = self._top
+        del self._row_counts[y]
+        if self._hashing:
+            del self._row_hashes[y]
+            self._hash = None
+        tops = self._col_tops
+        for x, item in enumerate(removed):
+            if item != empty:
+                self._col_counts[x] -= 1
+            if tops[x] == y:
+                tops[x] = self._find_top(x, y)
+            elif tops[x] > y:
+                tops[x] -= 1
+        if self._top == y:
+            self._top = self._scan_top(y)
+        elif self._top > y:
+            self._top -= 1
+        # The index of the last row before the delete still gets marked
+        self._mark_moved_rows(max(y, min(old_top, self._top)),
+                              self._num_rows + 1)
+
+    def _track_clear_rows(self, rows, removed):
+        """ Called after the sorted rows, holding the items in removed, have
+            been deleted and as many empty rows have been added to the top
+        """
+        empty = self._empty
+        old_top = self._top
+        for y in reversed(rows):
+            del self._row_counts[y]
+        self._row_counts[:0] = [0] * len(rows)
+        if self._hashing:
+            for y in reversed(rows):
+                del self._row_hashes[y]
+            self._row_hashes[:0] = [0] * len(rows)
+            self._hash = None
+        for row in removed:
+            for x, item in enumerate(row):
+                if item != empty:
+                    self._col_counts[x] -= 1
+        tops = self._col_tops
+        num_rows = self._num_rows
+        for x, top in enumerate(tops):
+            if top == num_rows:
+                continue
+            # rows below top move down by the number of cleared rows below
+            i = bisect_right(rows, top)
+            shift = len(rows) - i
+            if i and rows[i - 1] == top:
+                tops[x] = self._find_top(x, top + shift)
+            else:
+                tops[x] = top + shift
+        # filled cells only move down, and the cleared rows are now empty
+        self._top = self._scan_top(min(old_top, num_rows))
+        # rows below the lowest cleared row did not move
+        self._mark_moved_rows(min(old_top, self._top), rows[-1] + 1)
+
+    def _mark_moved_rows(self, start, stop):
+        """ Mark rows start to stop dirty after the rows in between moved,
+            O(1). Callers skip the rows above the stack both before and
+            after the move, which were and still are empty. A row index
+            that no longer exists is still marked so that it is redrawn if
+            it comes back
+        """
+        if start < stop:
+            self._dirty_from = min(self._dirty_from, start)
+            self._dirty_to = max(self._dirty_to, stop)
+
+    def _scan_top(self, start):
+        """ Returns the first row at or below row start holding a filled
+            cell, num_rows if there is none
+        """
+        row_counts = self._row_counts
+        for y in range(start, self._num_rows):
+            if row_counts[y]:
+                return y
+        return self._num_rows
+
+    def flush_dirty(self):
+        """ Returns what changed since the last call as a tuple
+            (rows, cells): a sorted list of rows whose every cell may have
+            changed and a sorted list of other changed (x, y) coordinates.
+            Tracking starts over afterwards
+
+        >>> board = Board(3, 4, 0, grid=[0, 0, 0, 0, 2, 0, 1, 1, 1, 0, 3, 0])
+        >>> board.flush_dirty()
+        ([], [])
+        >>> board.set_item(0, 3, 4)
+        >>> board.set_item(2, 0, 0)
+        >>> board.clear_rows([2])
+        1
+        >>> board.flush_dirty()
+        ([1, 2], [(0, 3)])
+        >>> board.flush_dirty()
+        ([], [])
+        """
+        start = self._dirty_from
+        stop = min(self._dirty_to, self._num_rows)
+        rows = list(range(start, stop))
+        cells = sorted((pos for pos in self._dirty_cells
+                        if not start <= pos[1] < stop
+                        and pos[1] < self._num_rows),
+                       key=lambda pos: (pos[1], pos[0]))
+        self._dirty_from, self._dirty_to = self._num_rows, 0
+        self._dirty_cells = set()
+        return rows, cells
+
+    def _hash_row(self, row):
+        row_hash = 0
+        for keys, item in zip(self._cell_keys, row):
+            row_hash ^= keys[item]
+        return row_hash
+
+    def _find_top(self, x, start):
+        """ Returns the row of the first filled cell in column x at or
+            below row start, num_rows if there is none. Empty columns and
+            rows are skipped by their counts
+        """
+        if not self._col_counts[x]:
+            return self._num_rows
+        empty = self._empty
+        rows = self._rows
+        row_counts = self._row_counts
+        for y in range(start, self._num_rows):
+            if row_counts[y] and rows[y][x] != empty:
+                return y
+        return self._num_rows
+
     def __str__(self):
         """ Print out the board items in a grid
 
@@ -418,12 +1050,522 @@ class Board:
         4 5
         ===
         """
-        s = '=' * (self._num_cols * 2 - 1) + '\n'
-        for i, val in enumerate(self._grid):
-            s += str(val)
-            if (i + 1) % self._num_cols != 0:
-                s += ' '
-            if (i + 1) % self._num_cols == 0:
-                s += '\n'
-        s += '=' * (self._num_cols * 2 - 1)
-        return s
+        border = '=' * (self._num_cols * 2 - 1)
+        lines = [border]
+        lines.extend(' '.join(map(str, self.get_row(y)))
+                     for y in range(self._num_rows))
+        lines.append(border)
+        return '\n'.join(lines)
+
+
+class _BoardView(Sequence):
+    """ Base class of the read-only views handed out by Board
+    """
+    __slots__ = ('_board',)
+
+    def __init__(self, board):
+        self._board = board
+
+    def __setitem__(self, key, value):
+        raise TypeError('Board views are read-only')
+
+    def __delitem__(self, key):
+        raise TypeError('Board views are read-only')
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {list(self)}>'
+
+
+class RowView(_BoardView):
+    """ A read-only view of row y of a Board
+    """
+    __slots__ = ('_y',)
+
+    def __init__(self, board, y):
+        super().__init__(board)
+        self._y = y
+
+    def __getitem__(self, x):
+        return self._board._rows[self._y][x]
+
+    def __len__(self):
+        return self._board._num_cols
+
+    def __iter__(self):
+        return iter(self._board._rows[self._y])
+
+    def __contains__(self, item):
+        return item in self._board._rows[self._y]
+
+
+class ColumnView(_BoardView):
+    """ A read-only view of column x of a Board
+    """
+    __slots__ = ('_x',)
+
+    def __init__(self, board, x):
+        super().__init__(board)
+        self._x = x
+
+    def __getitem__(self, y):
+        if isinstance(y, slice):
+            return [row[self._x] for row in self._board._rows[y]]
+        return self._board._rows[y][self._x]
+
+    def __len__(self):
+        return self._board._num_rows
+
+    def __iter__(self):
+        x = self._x
+        return (row[x] for row in self._board._rows)
+
+
+class GridView(_BoardView):
+    """ A read-only view of all cells of a Board in row major order, indexed
+        like the Board itself with either a number or a coordinate
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        board = self._board
+        if isinstance(key, int):
+            if key < 0:
+                key += len(board)
+            if not 0 <= key < len(board):
+                raise IndexError(f'Invalid index: {key}')
+            y, x = divmod(key, board._num_cols)
+            return board._rows[y][x]
+        return board._rows[key[1]][key[0]]
+
+    def __len__(self):
+        return len(self._board)
+
+    def __iter__(self):
+        return iter(self._board)
+
+    def __contains__(self, item):
+        return item in self._board
+
+
+class BitBoard(Board):
+    """ A Board that also keeps one integer occupancy mask per row. Bit x of
+        mask y is set when cell (x, y) holds anything but the empty item
+        (cell_item). Items (colors) stay in the flat grid so the Board API is
+        unchanged, while collision, row-full and row-clear checks become
+        bitwise operations on the masks.
+
+    >>> board = Board(3, 2, 0, grid=[0, 1, 0, 1, 1, 1], backend='bitboard')
+    >>> board
+    <BitBoard num_cols: 3 num_rows: 2>
+    >>> bin(board.get_row_mask(0)), bin(board.get_row_mask(1))
+    ('0b10', '0b111')
+    >>> board.full_rows()
+    [1]
+    >>> board[(2, 0)] = 5
+    >>> bin(board.get_row_mask(0)), board.fits([(0, 0), (0, -1)])
+    ('0b110', True)
+    >>> board.clear_rows([1])
+    1
+    >>> print(board)
+    =====
+    0 0 0
+    0 1 5
+    =====
+    >>> bin(board.get_row_mask(0)), bin(board.get_row_mask(1))
+    ('0b0', '0b110')
+    """
+
+    def __init__(self, num_cols=10, num_rows=20, cell_item=None, grid=None,
+                 backend='bitboard', compact=False, hashing=False):
+        super().__init__(num_cols, num_rows, cell_item, grid, compact=compact,
+                         hashing=hashing)
+        self._full_mask = (1 << num_cols) - 1
+        self._masks = [self._mask_of(self.get_row(y)) for y in range(num_rows)]
+
+    def _mask_of(self, items):
+        mask = 0
+        for x, item in enumerate(items):
+            if item != self._empty:
+                mask |= 1 << x
+        return mask
+
+    def get_row_mask(self, y):
+        return self._masks[y]
+
+    def fork(self):
+        child = super().fork()
+        child._masks = self._masks[:]
+        return child
+
+    def set_item(self, x, y, item):
+        super().set_item(x, y, item)
+        if item == self._empty:
+            self._masks[y] &= ~(1 << x)
+        else:
+            self._masks[y] |= 1 << x
+
+    def insert_row_at(self, y, lst):
+        super().insert_row_at(y, lst)
+        self._masks.insert(y, self._mask_of(lst))
+
+    def delete_row(self, y):
+        super().delete_row(y)
+        del self._masks[y]
+
+    def update_grid(self, new_grid):
+        super().update_grid(new_grid)
+        self._masks = [self._mask_of(self.get_row(y))
+                       for y in range(self._num_rows)]
+
+    def is_free(self, coordinate):
+        x, y = coordinate
+        return 0 <= x < self._num_cols and 0 <= y < self._num_rows \
+            and not self._masks[y] >> x & 1
+
+    def fits(self, coordinates):
+        masks = self._masks
+        for x, y in coordinates:
+            if not 0 <= x < self._num_cols or y >= self._num_rows:
+                return False
+            if y >= 0 and masks[y] >> x & 1:
+                return False
+        return True
+
+    def fits_at(self, offsets, x, y):
+        num_cols, num_rows, masks = self._num_cols, self._num_rows, self._masks
+        for dx, dy in offsets:
+            cx, cy = x + dx, y + dy
+            if not 0 <= cx < num_cols or cy >= num_rows:
+                return False
+            if cy >= 0 and masks[cy] >> cx & 1:
+                return False
+        return True
+
+    def is_row_full(self, y):
+        return self._masks[y] == self._full_mask
+
+    def full_rows(self, rows=None):
+        if rows is None:
+            rows = range(self._num_rows)
+        masks, full = self._masks, self._full_mask
+        return sorted(y for y in set(rows)
+                      if 0 <= y < self._num_rows and masks[y] == full)
+
+    def clear_rows(self, rows):
+        rows = sorted(set(rows))
+        num_cleared = super().clear_rows(rows)
+        for y in reversed(rows):
+            del self._masks[y]
+        self._masks[:0] = [0] * num_cleared
+        return num_cleared
+
+    def __repr__(self):
+        return f'<BitBoard num_cols: {self._num_cols} num_rows: {self._num_rows}>'
+
+
+class NumpyBoard(Board):
+    """ A Board stored as a 2-D numpy array of palette indices, shaped
+        (num_rows, num_cols). Items are added to the palette the first time
+        they are written, index 0 is always the empty item (cell_item).
+        Column, filter, membership and multi-row operations are array
+        operations; items are only decoded on the way out, so it is always
+        compact whatever the compact argument says. The filled cell
+        counters are array reductions computed on request rather than
+        running counts, as this backend is meant for bulk analysis.
+
+    >>> board = Board(3, 2, 0, grid=[0, 7, 0, 7, 9, 7], backend='numpy')
+    >>> board
+    <NumpyBoard num_cols: 3 num_rows: 2>
+    >>> board.get_col(1), board.get_row(1)
+    ([7, 9], [7, 9, 7])
+    >>> board.filter_coordinates(lambda item: item == 7)
+    [(1, 0), (0, 1), (2, 1)]
+    >>> 9 in board, 8 in board
+    (True, False)
+    >>> board.get_cells()
+    array([[0, 1, 0],
+           [1, 2, 1]], dtype=uint8)
+    >>> board.get_col_heights(), board.get_row_counts()
+    ([1, 2, 1], [1, 3])
+    >>> board.row_view(1), board.row_view(1).flags.writeable
+    (array([1, 2, 1], dtype=uint8), False)
+    >>> board.insert_rows_at(0, [[1, 2, 3], [4, 5, 6]])
+    >>> board.delete_rows([1, 2])
+    >>> print(board)
+    =====
+    1 2 3
+    7 9 7
+    =====
+    """
+
+    MAX_PALETTE = 256
+
+    def __init__(self, num_cols=10, num_rows=20, cell_item=None, grid=None,
+                 backend='numpy', compact=True, hashing=False):
+        # The hash is always computed on request, see zobrist_hash
+        if np is None:
+            raise ImportError('The numpy board backend requires numpy')
+        assert num_cols is not None and num_rows is not None
+        assert type(num_cols) == int and type(num_rows) == int
+        assert num_cols >= 0 and num_rows >= 0
+        self._num_rows = num_rows
+        self._num_cols = num_cols
+        self._empty = cell_item
+        self._palette = []
+        self._palette_index = {}
+        self._palette_arr = np.empty(0, dtype=object)
+        self._encode(cell_item)
+        self._dirty_from, self._dirty_to = num_rows, 0
+        self._dirty_cells = set()
+        if grid:
+            assert num_cols * num_rows == len(grid)
+            self._cells = self._encode_all(grid).reshape(num_rows, num_cols)
+        else:
+            self._cells = np.zeros((num_rows, num_cols), dtype=np.uint8)
+
+    def _encode(self, item):
+        """ Returns the palette index of item, adding it to the palette
+            if it is new
+        """
+        index = self._palette_index.get(item)
+        if index is None:
+            index = len(self._palette)
+            if index >= self.MAX_PALETTE:
+                raise ValueError(f'Palette is full, cannot add item: {item}')
+            self._palette.append(item)
+            self._palette_index[item] = index
+            self._palette_arr = np.empty(len(self._palette), dtype=object)
+            self._palette_arr[:] = self._palette
+        return index
+
+    def _encode_all(self, items):
+        return np.array([self._encode(item) for item in items], dtype=np.uint8)
+
+    def _decode_all(self, indices):
+        return self._palette_arr[indices].tolist()
+
+    def get_cells(self):
+        """ Returns a read-only view of the palette index array
+        """
+        cells = self._cells.view()
+        cells.flags.writeable = False
+        return cells
+
+    def row_view(self, y):
+        """ Returns a read-only array view of the palette indices of row y
+        """
+        return self.get_cells()[y]
+
+    def col_view(self, x):
+        """ Returns a read-only array view of the palette indices of column x
+        """
+        return self.get_cells()[:, x]
+
+    def grid_view(self):
+        """ Returns a read-only array view of the palette indices of all cells
+        """
+        return self.get_cells()
+
+    def get_palette(self):
+        """ Returns a COPY of the palette, palette[i] is the item of index i
+        """
+        return self._palette[:]
+
+    def fork(self):
+        """ Create a copy of this board. The array is small enough that it
+            is simply copied, only the palette array is shared
+        """
+        child = object.__new__(type(self))
+        child.__dict__ = self.__dict__.copy()
+        child._cells = self._cells.copy()
+        child._palette = self._palette[:]
+        child._palette_index = self._palette_index.copy()
+        child._dirty_cells = set(self._dirty_cells)
+        return child
+
+    def get_col(self, x):
+        return self._decode_all(self._cells[:, x])
+
+    def get_row(self, y):
+        assert 0 <= y < self._num_rows, f'Invalid y: {y}'
+        return self._decode_all(self._cells[y])
+
+    def get_item(self, x, y):
+        return self._palette[self._cells[y, x]]
+
+    def set_item(self, x, y, item):
+        index = self._encode(item)
+        if self._cells[y, x] != index:
+            self._cells[y, x] = index
+            self._dirty_cells.add((x, y))
+
+    def insert_row_at(self, y, lst):
+        self.insert_rows_at(y, [lst])
+
+    def insert_rows_at(self, y, rows):
+        block = self._encode_all([item for row in rows for item in row])
+        self._cells = np.concatenate((
+            self._cells[:y],
+            block.reshape(len(rows), self._num_cols),
+            self._cells[y:]
+        ))
+        self._num_rows += len(rows)
+        self._mark_moved_rows(y, self._num_rows)
+
+    def delete_row(self, y):
+        self.delete_rows([y])
+
+    def delete_rows(self, rows):
+        rows = sorted(set(rows))
+        self._cells = np.delete(self._cells, rows, axis=0)
+        self._num_rows -= len(rows)
+        if rows:
+            self._mark_moved_rows(rows[0], self._num_rows)
+
+    def filter_coordinates(self, fn):
+        matches = [i for i, item in enumerate(self._palette) if fn(item)]
+        ys, xs = np.nonzero(np.isin(self._cells, matches))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def update_grid(self, new_grid):
+        assert len(new_grid) == len(self), 'unequal grid lengths'
+        self._cells = self._encode_all(new_grid).reshape(
+            self._num_rows, self._num_cols)
+        self._mark_moved_rows(0, self._num_rows)
+
+    def get_grid(self):
+        return self._decode_all(self._cells.ravel())
+
+    def is_free(self, coordinate):
+        x, y = coordinate
+        return 0 <= x < self._num_cols and 0 <= y < self._num_rows \
+            and self._cells[y, x] == 0
+
+    def fits_at(self, offsets, x, y):
+        num_cols, num_rows, cells = self._num_cols, self._num_rows, self._cells
+        for dx, dy in offsets:
+            cx, cy = x + dx, y + dy
+            if not 0 <= cx < num_cols or cy >= num_rows:
+                return False
+            if cy >= 0 and cells[cy, cx]:
+                return False
+        return True
+
+    def is_row_full(self, y):
+        return bool(self._cells[y].all())
+
+    def full_rows(self, rows=None):
+        full = np.flatnonzero(self._cells.all(axis=1))
+        if rows is None:
+            return full.tolist()
+        return sorted(set(full.tolist()).intersection(rows))
+
+    def clear_rows(self, rows):
+        rows = sorted(set(rows))
+        if rows:
+            kept = np.delete(self._cells, rows, axis=0)
+            self._cells = np.concatenate((
+                np.zeros((len(rows), self._num_cols), dtype=np.uint8), kept
+            ))
+            self._mark_moved_rows(0, rows[-1] + 1)
+        return len(rows)
+
+    def get_row_mask(self, y):
+        mask = 0
+        for x in np.flatnonzero(self._cells[y]).tolist():
+            mask |= 1 << x
+        return mask
+
+    def get_row_count(self, y):
+        return int(np.count_nonzero(self._cells[y]))
+
+    def get_col_count(self, x):
+        return int(np.count_nonzero(self._cells[:, x]))
+
+    def get_col_height(self, x):
+        filled = np.flatnonzero(self._cells[:, x])
+        return int(self._num_rows - filled[0]) if filled.size else 0
+
+    def get_row_counts(self):
+        return np.count_nonzero(self._cells, axis=1).tolist()
+
+    def get_col_counts(self):
+        return np.count_nonzero(self._cells, axis=0).tolist()
+
+    def get_col_heights(self):
+        filled = self._cells != 0
+        heights = np.where(filled.any(axis=0),
+                           self._num_rows - filled.argmax(axis=0), 0)
+        return heights.tolist()
+
+    def zobrist_hash(self):
+        """ Computed on request from the array, matches the hash of an
+            equal list or bitboard backed board
+        """
+        row_hashes = [0] * self._num_rows
+        for y, x in np.argwhere(self._cells).tolist():
+            row_hashes[y] ^= zobrist_key('cell', x, self._palette[self._cells[y, x]])
+        return _combine_row_hashes(row_hashes)
+
+    def __contains__(self, item):
+        index = self._palette_index.get(item)
+        return index is not None and bool((self._cells == index).any())
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            key = self.index_to_coordinate(key)
+        return self.get_item(key[0], key[1])
+
+    def __setitem__(self, key, value):
+        if isinstance(key, int):
+            key = self.index_to_coordinate(key)
+        self.set_item(key[0], key[1], value)
+
+    def __iter__(self):
+        return iter(self.get_grid())
+
+    def __reversed__(self):
+        return reversed(self.get_grid())
+
+    def __len__(self):
+        return self._num_cols * self._num_rows
+
+    def __repr__(self):
+        return f'<NumpyBoard num_cols: {self._num_cols} num_rows: {self._num_rows}>'
+
+
+_BACKENDS = {
+    'list': Board,
+    'bitboard': BitBoard,
+    'numpy': NumpyBoard,
+}
+
+
+def _select_backend(name):
+    if name not in _BACKENDS:
+        raise ValueError(f'Unknown board backend: "{name}"')
+    return _BACKENDS[name]
+
+
+class _CellKeys(dict):
+    """ The Zobrist keys of the items of column x, computed once on first
+        lookup, 0 for the empty item so that empty cells hash to nothing
+    """
+
+    def __init__(self, x, empty):
+        super().__init__({empty: 0})
+        self._x = x
+
+    def __missing__(self, item):
+        key = self[item] = zobrist_key('cell', self._x, item)
+        return key
+
+
+def _combine_row_hashes(row_hashes):
+    """ Returns the board hash of the hashes of its rows from the top
+    """
+    board_hash = 0
+    for y, row_hash in enumerate(row_hashes):
+        if row_hash:
+            board_hash ^= row_key(row_hash, y)
+    return board_hash
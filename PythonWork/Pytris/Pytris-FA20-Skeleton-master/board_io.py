@@ -0,0 +1,231 @@
+""" A packed binary format for storing many Board snapshots in one file.
+
+    File layout (all integers little endian):
+
+        MAGIC                 8 bytes
+        header length         4 bytes, unsigned
+        header                JSON: num_cols, num_rows and palette
+        padding               zeros up to a multiple of 8 bytes
+        records               one fixed size record per board
+
+    Each record holds num_rows occupancy masks of ceil(num_cols / 8) bytes
+    each (bit x of mask y is set when cell (x, y) is filled), followed by
+    one 4-bit palette index per cell in row major order, two cells per byte
+    with the first cell in the low nibble. Palette index 0 is the empty item.
+
+    Because records have a fixed size, BoardDataset can memory-map a file and
+    decode any record on demand without reading the rest of the file.
+"""
+import json
+import mmap
+import struct
+from board import Board
+from colors import Color
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'PYTRISB1'
+MAX_PALETTE = 16
+DEFAULT_PALETTE = [(0, 0, 0)] + [color.value for color in Color]
+# For boards that already store palette indices (see colors.make_palette)
+INDEX_PALETTE = list(range(len(Color) + 1))
+
+_HEADER_LEN = struct.Struct('<I')
+
+
+def record_size(num_cols, num_rows):
+    """ Returns the number of bytes used by one board record
+
+    >>> record_size(10, 20)
+    140
+    """
+    mask_bytes = (num_cols + 7) // 8
+    return num_rows * mask_bytes + (num_cols * num_rows + 1) // 2
+
+
+def board_to_bytes(board, palette=DEFAULT_PALETTE):
+    """ Pack the items of board into one record. Empty cells are encoded as
+        palette index 0 whatever palette[0] is, every other item must be
+        in palette
+
+    >>> board = Board(3, 2, (0, 0, 0))
+    >>> board.set_item(1, 1, Color.RED.value)
+    >>> board_to_bytes(board).hex()
+    '0002000009'
+    """
+    if len(palette) > MAX_PALETTE:
+        raise ValueError(f'Palette has more than {MAX_PALETTE} items')
+    index_of = {}
+    for i, item in enumerate(palette):
+        index_of.setdefault(item, i)
+    empty = board.get_empty_item()
+    num_cols = board.get_num_cols()
+    mask_bytes = (num_cols + 7) // 8
+    data = bytearray()
+    indices = []
+    for y in range(board.get_num_rows()):
+        data += board.get_row_mask(y).to_bytes(mask_bytes, 'little')
+        for item in board.get_row(y):
+            if item == empty:
+                indices.append(0)
+            elif item in index_of:
+                indices.append(index_of[item])
+            else:
+                raise ValueError(f'Item not in palette: {item}')
+    if len(indices) % 2:
+        indices.append(0)
+    data += bytes(lo | hi << 4 for lo, hi in zip(indices[::2], indices[1::2]))
+    return bytes(data)
+
+
+def board_from_bytes(data, num_cols, num_rows, palette=DEFAULT_PALETTE,
+                     backend='list'):
+    """ Unpack one record into a new Board whose empty item is palette[0]
+
+    >>> board = Board(3, 2, (0, 0, 0), backend='bitboard')
+    >>> board.set_item(1, 1, Color.RED.value)
+    >>> copy = board_from_bytes(board_to_bytes(board), 3, 2, backend='bitboard')
+    >>> copy.get_grid() == board.get_grid(), copy.get_row_mask(1)
+    (True, 2)
+    """
+    num_cells = num_cols * num_rows
+    color_start = num_rows * ((num_cols + 7) // 8)
+    grid = []
+    for byte in data[color_start : color_start + (num_cells + 1) // 2]:
+        grid.append(palette[byte & 0xF])
+        grid.append(palette[byte >> 4])
+    return Board(num_cols, num_rows, palette[0], grid=grid[:num_cells],
+                 backend=backend)
+
+
+class BoardWriter:
+    """ Append boards of one size to a new file, use as a context manager
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'boards.bin')
+    >>> board = Board(4, 3, (0, 0, 0))
+    >>> with BoardWriter(path, 4, 3) as writer:
+    ...     for x in range(4):
+    ...         board.set_item(x, 2, Color.CYAN.value)
+    ...         writer.write(board)
+    >>> with BoardDataset(path) as dataset:
+    ...     len(dataset), dataset.get_masks(1), dataset[3].full_rows()
+    (4, [0, 0, 3], [2])
+    """
+
+    def __init__(self, path, num_cols, num_rows, palette=DEFAULT_PALETTE):
+        if len(palette) > MAX_PALETTE:
+            raise ValueError(f'Palette has more than {MAX_PALETTE} items')
+        self._num_cols = num_cols
+        self._num_rows = num_rows
+        self._palette = list(palette)
+        self._file = open(path, 'wb')
+        header = json.dumps({
+            'num_cols': num_cols,
+            'num_rows': num_rows,
+            'palette': self._palette,
+        }).encode()
+        prefix = MAGIC + _HEADER_LEN.pack(len(header)) + header
+        self._file.write(prefix + bytes(-len(prefix) % 8))
+
+    def write(self, board):
+        assert board.get_num_cols() == self._num_cols \
+            and board.get_num_rows() == self._num_rows, 'unequal board sizes'
+        self._file.write(board_to_bytes(board, self._palette))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BoardDataset:
+    """ A read-only, memory-mapped sequence of the boards in a file written
+        by BoardWriter. Nothing is decoded until a record is requested
+    """
+
+    def __init__(self, path, backend='list'):
+        self._backend = backend
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'Not a board file: {path}')
+        header_start = len(MAGIC) + _HEADER_LEN.size
+        header_len, = _HEADER_LEN.unpack_from(self._mmap, len(MAGIC))
+        header = json.loads(self._mmap[header_start : header_start + header_len])
+        self._num_cols = header['num_cols']
+        self._num_rows = header['num_rows']
+        # JSON turns tuples into lists
+        self._palette = [tuple(item) if isinstance(item, list) else item
+                         for item in header['palette']]
+        self._offset = header_start + header_len
+        self._offset += -self._offset % 8
+        self._mask_bytes = (self._num_cols + 7) // 8
+        self._record_size = record_size(self._num_cols, self._num_rows)
+        self._len = (len(self._mmap) - self._offset) // self._record_size
+
+    def get_record(self, i):
+        """ Returns a zero-copy memoryview of the raw bytes of record i
+        """
+        if not 0 <= i < self._len:
+            raise IndexError(f'Invalid record: {i}')
+        start = self._offset + i * self._record_size
+        return memoryview(self._mmap)[start : start + self._record_size]
+
+    def get_masks(self, i):
+        """ Returns the occupancy masks of the rows of board i
+        """
+        record = self.get_record(i)
+        size = self._mask_bytes
+        return [int.from_bytes(record[y * size : (y + 1) * size], 'little')
+                for y in range(self._num_rows)]
+
+    def mask_array(self):
+        """ Returns a read-only numpy view of the mask bytes of all boards,
+            shaped (len(self), num_rows, ceil(num_cols / 8)). Requires numpy.
+            The view borrows the memory map, drop it before calling close()
+        """
+        if np is None:
+            raise ImportError('mask_array requires numpy')
+        records = np.frombuffer(self._mmap, dtype=np.uint8, offset=self._offset,
+                                count=self._len * self._record_size)
+        records = records.reshape(self._len, self._record_size)
+        masks = records[:, :self._num_rows * self._mask_bytes]
+        return masks.reshape(self._len, self._num_rows, self._mask_bytes)
+
+    def get_palette(self):
+        return self._palette[:]
+
+    def get_num_cols(self):
+        return self._num_cols
+
+    def get_num_rows(self):
+        return self._num_rows
+
+    def close(self):
+        self._mmap.close()
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        return board_from_bytes(self.get_record(i), self._num_cols,
+                                self._num_rows, self._palette, self._backend)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return (self[i] for i in range(self._len))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -11,3 +11,29 @@ class Color(Enum):
     PURPLE = (146, 44, 140)
     BLUE = (0, 90, 156)
     RED = (238, 40, 51)
+
+    @property
+    def index(self):
+        """ Palette index of this color, see make_palette
+
+        >>> Color.WHITE.index, Color.RED.index
+        (1, 9)
+        """
+        return _PALETTE_INDEX[self]
+
+
+# Palette index of an empty cell, it decodes to the view's rect_color
+EMPTY = 0
+
+_PALETTE_INDEX = {color: i for i, color in enumerate(Color, start=1)}
+
+
+def make_palette(empty_color):
+    """ Returns the palette that decodes palette indices to RGB colors:
+        index 0 (EMPTY) is empty_color, followed by every Color in order
+
+    >>> palette = make_palette((0, 0, 25))
+    >>> palette[EMPTY], palette[Color.CYAN.index] == Color.CYAN.value, len(palette)
+    ((0, 0, 25), True, 10)
+    """
+    return (empty_color,) + tuple(color.value for color in Color)
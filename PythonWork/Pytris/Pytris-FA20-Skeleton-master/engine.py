@@ -0,0 +1,299 @@
+""" The rules of Pytris without any display or clock: spawning, moving,
+    gravity, holding, clearing rows, scoring and game over.
+
+    A PytrisGame only advances when it is given an Action through step() or
+    a gravity tick through tick(), so it runs as fast as the CPU allows and
+    does not need pygame. PytrisController drives one with key presses and
+    a wall clock, and draws what changed through a GameListener.
+"""
+from collections import deque
+from enum import Enum, auto
+from colors import EMPTY
+from models import Pytromino, Holder, pytromino_factory
+from randomizer import UniformRandomizer
+
+
+class Action(Enum):
+    """ What a player can do in a step, LEFT, RIGHT, DOWN and ROTATE share
+        their names with movegen.Move
+    """
+    LEFT = auto()
+    RIGHT = auto()
+    DOWN = auto()       # soft drop, 1 point per row
+    ROTATE = auto()     # 90 degrees clockwise
+    HARD_DROP = auto()  # 2 points per row, freezes the pytromino
+    HOLD = auto()
+
+
+_MOVES = {
+    Action.LEFT: (-1, 0, 0),
+    Action.RIGHT: (1, 0, 0),
+    Action.DOWN: (0, 1, 0),
+    Action.ROTATE: (0, 0, 1),
+}
+
+
+class GameListener:
+    """ Gets told what changed in a PytrisGame, e.g. to draw it. Every
+        method does nothing by default
+    """
+
+    def on_nextup(self):
+        """ The nextup queue changed """
+
+    def on_spawn(self):
+        """ A new current pytromino was placed at the spawn """
+
+    def on_move(self, src_pos):
+        """ The current pytromino moved from src_pos, its blocks that were
+            on the board
+        """
+
+    def on_lock(self, blocks_pos):
+        """ The current pytromino was frozen into the board at blocks_pos """
+
+    def on_clearing(self, rows):
+        """ The full rows are about to be cleared from the board, on_clear
+            follows once they are
+        """
+
+    def on_clear(self, rows):
+        """ The full rows were cleared from the board """
+
+    def on_hold(self, src_pos):
+        """ The current pytromino went into the holder from src_pos, its
+            blocks that were on the board
+        """
+
+    def on_score(self, score):
+        """ The score changed """
+
+
+class PytrisGame:
+
+    def __init__(self, board, num_nextup=4, spawn=(4, 0), randomizer=None,
+                 listener=None):
+        """ A game of Pytris on board
+
+        Parameters
+        ----------
+        board : Board
+            An initialized Board with cell_item colors.EMPTY, the frozen
+            pytrominos are written to it as palette indices
+
+        num_nextup : int
+            Number of upcoming pytromino types to keep. Default 4
+
+        spawn : (int, int)
+            Where new pytrominos are placed. Default (4, 0)
+
+        randomizer : () -> Pytromino.Types
+            Returns the type of the next pytromino to queue, see
+            randomizer.py. Defaults to a randomly seeded UniformRandomizer
+
+        listener : GameListener
+            Gets told about every change. Defaults to a GameListener that
+            ignores them
+
+        >>> from board import Board
+        >>> game = PytrisGame(Board(cell_item=EMPTY),
+        ...                   randomizer=lambda: Pytromino.Types.O)
+        >>> game.start()
+        >>> game.step(Action.HARD_DROP)
+        True
+        >>> game.get_score(), game.get_board().get_row_count(19)
+        (38, 2)
+        >>> game.tick()
+        True
+        """
+        assert board.get_empty_item() == EMPTY, \
+            f'Board cell_item must be EMPTY: {board.get_empty_item()}'
+        self._board = board
+        self._spawn = spawn
+        self._num_cols = board.get_num_cols()
+        if randomizer is None:
+            randomizer = UniformRandomizer()
+        self._randomizer = randomizer
+        self._listener = listener if listener is not None else GameListener()
+        self._nextup = deque(
+            [randomizer() for _ in range(num_nextup)], maxlen=num_nextup
+        )
+        self._holder = Holder()
+        self._cur_pytromino = None
+        self._score = 0
+        self._lines = 0
+        self._pieces = 0
+        self._game_over = False
+
+# --------------------------------- Open APIs -------------------------------- #
+
+    def start(self):
+        """ Reset the score and spawn the first pytromino
+        """
+        self._score = 0
+        self._lines = 0
+        self._pieces = 0
+        self._game_over = False
+        self._spawn_pytromino()
+
+    def step(self, action):
+        """ Apply action to the current pytromino. Returns whether it had
+            any effect
+        """
+        if self._game_over:
+            return False
+        if action is Action.HARD_DROP:
+            return self._hard_drop()
+        if action is Action.HOLD:
+            return self._hold()
+        success = self._move(*_MOVES[action])
+        if action is Action.DOWN and success:
+            self._add_score(1)
+        return success
+
+    def tick(self):
+        """ Apply gravity: shift the current pytromino down 1 row, or when it
+            can't go down anymore, freeze it, clear the full rows and spawn
+            the next pytromino. Returns whether it went down
+        """
+        if self._game_over:
+            return False
+        if self._move(0, 1, 0):
+            return True
+        self._lock()
+        return False
+
+    def is_game_over(self):
+        return self._game_over
+
+    def get_board(self):
+        return self._board
+
+    def get_cur_pytromino(self):
+        return self._cur_pytromino
+
+    def get_spawn(self):
+        """ Returns where new pytrominos are placed
+        """
+        return self._spawn
+
+    def get_nextup(self):
+        """ Returns a tuple of the upcoming pytromino types
+        """
+        return tuple(self._nextup)
+
+    def get_held(self):
+        """ Returns the held pytromino type, None if the holder is empty
+        """
+        return self._holder.get_item()
+
+    def can_hold(self):
+        return self._holder.is_open()
+
+    def get_score(self):
+        return self._score
+
+    def get_lines(self):
+        """ Returns the number of rows cleared since start
+        """
+        return self._lines
+
+    def get_pieces(self):
+        """ Returns the number of pytrominos frozen since start
+        """
+        return self._pieces
+
+# ----------------------------- Helper Functions ----------------------------- #
+
+    def _spawn_pytromino(self):
+        if self._game_over: return
+        pytromino_t = self._nextup.popleft()
+        self._nextup.append(self._randomizer())
+        self._listener.on_nextup()
+        self._cur_pytromino = pytromino_factory(pytromino_t)
+        self._cur_pytromino.place_at(self._spawn)
+        # Check if new piece can be placed, if not, game over
+        on_board_blocks = self._cur_pytromino.filter_blocks_pos(
+            self._board.valid_coordinate
+        )
+        for pos in on_board_blocks:
+            if not self._board.is_free(pos):
+                self._game_over = True
+                return
+        self._listener.on_spawn()
+
+    def _on_board_blocks(self):
+        return self._cur_pytromino.filter_blocks_pos(
+            self._board.valid_coordinate
+        )
+
+    def _move(self, dx, dy, drot):
+        src_pos = self._on_board_blocks()
+        success = self._cur_pytromino.try_move(dx, dy, drot, self._board)
+        if success:
+            self._listener.on_move(src_pos)
+        return success
+
+    def _lock(self):
+        """ Freeze the current pytromino, clear rows and spawn the next
+        """
+        self._holder.open()
+        self._pieces += 1
+        blocks_pos = self._cur_pytromino.get_blocks_pos()
+        color = self._cur_pytromino.get_color_index()
+        for pos in blocks_pos:
+            if self._board.valid_coordinate(pos):
+                self._board[pos] = color
+            else:
+                self._game_over = True
+        self._listener.on_lock(blocks_pos)
+        if self._game_over: return
+        cleared_rows = self._board.full_rows(
+            self._cur_pytromino.get_unique_rows()
+        )
+        if cleared_rows:
+            self._listener.on_clearing(cleared_rows)
+        # New empty rows are added to top of the board
+        self._board.clear_rows(cleared_rows)
+        if cleared_rows:
+            self._lines += len(cleared_rows)
+            # Each cleared row is worth 100 points for now
+            self._add_score(100 * len(cleared_rows))
+            self._listener.on_clear(cleared_rows)
+        self._spawn_pytromino()
+
+    def _hard_drop(self):
+        distance = self._board.drop_distance(
+            self._cur_pytromino.get_blocks_pos()
+        )
+        if distance and self._move(0, distance, 0):
+            self._add_score(2 * distance)
+        self._lock()
+        return True
+
+    def _hold(self):
+        if not self._holder.is_open():
+            return False
+        cur_pytromino_t = self._cur_pytromino.get_type()
+        next_pytromino_t = self._holder.get_item()
+        if next_pytromino_t:
+            # Make sure the switched pytromino can be placed
+            cur_pytromino_center = self._cur_pytromino.get_blocks_pos()[0]
+            next_pytromino = pytromino_factory(next_pytromino_t)
+            next_pytromino.place_at(cur_pytromino_center)
+            if not self._board.fits(next_pytromino.get_blocks_pos()):
+                return False
+        src_pos = self._on_board_blocks()
+        self._holder.store(cur_pytromino_t)
+        self._holder.close()
+        self._listener.on_hold(src_pos)
+        if next_pytromino_t:
+            self._cur_pytromino = next_pytromino
+            self._listener.on_spawn()
+        else:
+            self._spawn_pytromino()
+        return True
+
+    def _add_score(self, num):
+        self._score += num
+        self._listener.on_score(self._score)
@@ -1,13 +1,32 @@
-from models import Pytromino, Holder, pytromino_factory
+from models import SHAPES
 from pygame.locals import *
-from random import seed, choice
-from collections import deque
+from random import Random
+from time import perf_counter
+from colors import EMPTY
+from engine import PytrisGame, GameListener, Action
+from profiler import FrameProfiler
+from randomizer import make_randomizer
+from replay import ReplayRecorder, save as save_replay
 # To be deleted
 from board import Board
 from view import PytrisViewManager
-class PytrisController:
 
-    def __init__(self, board : Board, gui : PytrisViewManager, max_fps=60, a=None):
+# Keys of the player's moves, ignored when an agent plays
+_MOVE_KEYS = (K_SPACE, K_DOWN, K_LEFT, K_RIGHT, K_UP, K_c)
+# Frames between updates of the profiler overlay
+_OVERLAY_INTERVAL = 15
+# Logical ticks per second, stepped from wall time whatever the frame rate
+_TICK_RATE = 60
+# Most wall time in seconds caught up on in one frame, the rest is dropped
+# so that a stall does not make the game rush to catch up
+_MAX_CATCH_UP = 0.25
+
+
+class PytrisController(GameListener):
+
+    def __init__(self, board : Board, gui : PytrisViewManager, max_fps=60, a=None,
+                 randomizer='uniform', agent=None, replay_path=None,
+                 profiler=None):
         """
         Parameters
         ----------
@@ -19,26 +38,62 @@ class PytrisController:
 
         max_fps : int
             Upper limit on in game FPS. Default 30
+
+        a : int
+            Seed of this controller's own PRNG. Default None for a random
+            seed
+
+        randomizer : str
+            How pytromino types are drawn, a name in
+            randomizer.RANDOMIZERS: 'uniform' or '7bag'. Default 'uniform'
+
+        agent : object
+            Plays instead of the keyboard, one action per logical tick, e.g. an
+            agent.HeuristicAgent. Its act(game) gets the engine.PytrisGame
+            and returns the engine.Action to step. Default None to play with
+            the keyboard
+
+        replay_path : str
+            File to save the replay of the game to when it ends, see
+            replay.py. Default None to not save it
+
+        profiler : profiler.FrameProfiler
+            Times the phases of every frame of the game. P shows its
+            overlay. Default None for one that neither logs nor writes a CSV
         """
         self._board = board
         self._gui = gui
         self._fps = max_fps
 
-        self._cur_pytromino = None
-        self._pytromino_types = list(Pytromino.Types)
         self._pytro_start_coord = (4, 0)
+        self._ghost_pos = []
+        self._agent = agent
+        self._replay_path = replay_path
+        self._profiler = profiler if profiler is not None else FrameProfiler()
+        self._show_profile = False
 
         self._num_cols = board.get_num_cols()
         self._num_rows = board.get_num_rows()
         self._num_nextup = gui.get_num_nextup()
         self._pyg = gui.get_pygame()
-        self._holder = Holder()
-        self._empty_cell_color = self._gui.get_rect_color()
-        # Seed PRNG before creating nextup
-        seed(a)
-        self._nextup = deque(
-            [self.get_random_pytromino_t() for _ in range(self._num_nextup)],
-            maxlen=self._num_nextup
+        self._empty_cell_color = EMPTY
+        # Own PRNG, other controllers and the random module are unaffected.
+        # Always seeded by a known seed so that the game can be replayed
+        self._seed = a if a is not None else Random().getrandbits(32)
+        self._rng = Random(self._seed)
+        self._randomizer_name = randomizer
+        self._randomizer = make_randomizer(randomizer, self._rng)
+        # Inputs are recorded by logical tick, not frame or wall clock
+        self._recorder = None
+        self._tick = 0
+        self._gravity_tick = 0
+        # The game rules, this controller draws what changes as its listener
+        self._game = PytrisGame(
+            board,
+            num_nextup=self._num_nextup,
+            spawn=self._pytro_start_coord,
+            randomizer=self.get_random_pytromino_t,
+            listener=self
         )
         # Initialize FPS clock
         self._fps_clock = self._pyg.time.Clock()
@@ -48,8 +103,7 @@ class PytrisController:
 
         self._start_speed = 1 # 1 row / sec
         self._speed_incr = 0.1 # + 0.1 row / sec
-        self._score = 0
-        self._game_over = False
+        self._quit = False
         self._level = 1
 
 # ============================================================================ #
@@ -60,7 +114,7 @@ class PytrisController:
         run = True
         self._gui.init_window()
         self._gui.draw_text_center("PRESS ANY KEY TO START")
-        self._gui.render()
+        self._gui.flush()
         while run:
             for event in self._pyg.event.get():
                 if event.type == QUIT:
@@ -72,7 +126,7 @@ class PytrisController:
                         break
                     self.start_game()
                     self._gui.draw_text_center("GAME OVER")
-                    self._gui.render()
+                    self._gui.flush()
                     self._pyg.time.wait(1000)
                     run = False
                     break
@@ -85,244 +139,301 @@ class PytrisController:
 
     def start_game(self):
         cur_speed = self._start_speed
-        prev_time = self._pyg.time.get_ticks()
-        self._score = 0
-        self._game_over = False
+        # Logical ticks between automatic shifts down
+        gravity_interval = max(1, round(_TICK_RATE / cur_speed))
+        tick_time = 1 / _TICK_RATE
+        self._quit = False
         self._level = 1
+        self._start_recording()
         self._gui.init_window()
-        self._init_new_pytromino()
+        self._game.start()
+        profiler = self._profiler
+        # Wall time not yet stepped as logical ticks
+        lag = 0.0
+        last_time = perf_counter()
 
-        while not self._game_over:
-            for event in self._pyg.event.get():
+        while not self._quit and not self._game.is_game_over():
+            profiler.start_frame()
+            profiler.enter('events')
+            events = self._pyg.event.get()
+            profiler.exit()
+            profiler.enter('input')
+            for event in events:
                 if event.type == QUIT:
-                    self._game_over = True
+                    self._quit = True
                     break
                 if event.type == KEYDOWN:
                     if event.key == K_ESCAPE:
-                        self._game_over = True
+                        self._quit = True
                         break
-                    elif event.key == K_c:
-                        self._hold_pytromino()
+                    elif self._agent is not None and event.key in _MOVE_KEYS:
+                        # The agent has the controls
+                        continue
+                    elif event.key == K_SPACE:
+                        self._input(Action.HARD_DROP)
                     else:
-                        self._handle_movements(event.key)
+                        self._handle_key(event.key)
+            profiler.exit()
+
+            if self._show_profile \
+                    and profiler.get_num_frames() % _OVERLAY_INTERVAL == 0:
+                self._gui.draw_overlay(profiler.overlay_lines())
+                self._render()
 
+            # Step as many logical ticks as wall time has passed, so that
+            # the game runs at _TICK_RATE however fast frames are drawn
+            now = perf_counter()
+            lag = min(lag + now - last_time, _MAX_CATCH_UP)
+            last_time = now
+            while lag >= tick_time and not self._quit \
+                    and not self._game.is_game_over():
+                lag -= tick_time
+                if self._agent is not None:
+                    profiler.enter('input')
+                    self._input(self._agent.act(self._game))
+                    profiler.exit()
+                self._tick += 1
+                # Automatic shift down 1, freezes the pytromino when it can't
+                if self._tick - self._gravity_tick >= gravity_interval:
+                    profiler.enter('gravity')
+                    self._input(None)
+                    profiler.exit()
+
+            # Everything drawn this frame is shown before waiting for the
+            # next one, in one display update when the view coalesces
+            profiler.enter('render')
+            self._gui.flush()
+            profiler.exit()
+            profiler.enter('wait')
             self._fps_clock.tick(self._fps)
-            # Automatic shift down 1
-            cur_time = self._pyg.time.get_ticks()
-            if cur_time - prev_time >= 1000/cur_speed:
-                success = self._move_cur_pytromino(Pytromino.shift_down_fn(1))
-                # Pytromino can't go down anymore
-                if not success:
-                    # Freeze position to board
-                    self._conclude_cur_pytromino_turn()
-                    # Check for row clearance(s)
-                    self._check_row_clearance()
-                    # Initialize life of the next pytromino
-                    self._init_new_pytromino()
-                prev_time = cur_time
+            profiler.exit()
+            profiler.end_frame()
+
+        profiler.close()
+        if self._replay_path is not None:
+            save_replay(self.get_replay(), self._replay_path)
+
+    def play_replay(self, replay, speed=1.0):
+        """ Show the game of replay, recorded by a controller with the same
+            seed, randomizer and board, at speed times the rate it was
+            played at, 0 for as fast as possible. Esc stops it
+        """
+        assert (replay.seed, replay.randomizer) \
+            == (self._seed, self._randomizer_name), \
+            f'Replay of another seed or randomizer: {replay.seed}'
+        fps = replay.fps * speed
+        self._quit = False
+        self._start_recording()
+        self._gui.init_window()
+        self._game.start()
+        for tick, action in replay.inputs:
+            while self._tick < tick and not self._quit:
+                for event in self._pyg.event.get():
+                    if event.type == QUIT or \
+                            (event.type == KEYDOWN and event.key == K_ESCAPE):
+                        self._quit = True
+                self._gui.flush()
+                self._fps_clock.tick(fps)
+                self._tick += 1
+            if self._quit:
+                break
+            self._input(action)
+        self._gui.flush()
+
+    def get_replay(self):
+        """ Returns the replay.Replay of the current or last game, None
+            before any
+        """
+        if self._recorder is None:
+            return None
+        return self._recorder.get_replay(self._game)
+
+    def get_game(self):
+        return self._game
+
+    def get_profiler(self):
+        return self._profiler
+
+    def get_random_pytromino_t(self):
+        return self._randomizer()
 
 # ============================================================================ #
-# =========================== Additional Functions =========================== #
+# ================================= Listener ================================= #
 # ============================================================================ #
 
-    def _init_new_pytromino(self):
-        if self._game_over: return
-        self._cur_pytromino = self._get_new_pytromino()
-        self._cur_pytromino.place_at(self._pytro_start_coord)
-        # Check if new piece can be placed, if not, game over
-        on_board_blocks = self._cur_pytromino.filter_blocks_pos(
+    def on_nextup(self):
+        x = 1
+        y = 2
+        self._gui.init_pytro_nextup()
+        for i, t in enumerate(self._game.get_nextup()):
+            self._draw_pytromino_preview(
+                self._gui.draw_rectangle_in_nextup, t, (x, 4 * i + y)
+            )
+        self._render()
+
+    def on_spawn(self):
+        self._draw_cur_pytromino()
+
+    def on_move(self, src_pos):
+        dest_pos = self._cur_pytromino().filter_blocks_pos(
             self._board.valid_coordinate
         )
-        for pos in on_board_blocks:
-            if self._board[pos] != self._empty_cell_color:
-                self._game_over = True
-                return
-        self._draw_cur_pytromino()
+        if self._gui.get_ghost_color() is None:
+            self._gui.move_rectangles_in(
+                PytrisViewManager.Grid.MID, 
+                src_pos, 
+                dest_pos,
+                self._cur_pytromino().get_color_index()
+            )
+        else:
+            # The ghost goes between erasing and drawing the pytromino
+            self._gui.draw_rectangles_in(
+                PytrisViewManager.Grid.MID, src_pos, self._empty_cell_color
+            )
+            self._draw_ghost_pytromino()
+            self._gui.draw_rectangles_in(
+                PytrisViewManager.Grid.MID, 
+                dest_pos, 
+                self._cur_pytromino().get_color_index()
+            )
+        # For better UX, render movement rightaway
+        self._render()
+
+    def on_lock(self, blocks_pos):
+        # The frozen blocks are already on screen, covering the ghost
+        self._board.flush_dirty()
+        self._ghost_pos = []
 
-    def _conclude_cur_pytromino_turn(self):
-        if self._game_over: return
-        self._holder.open()
-        # Freezing current pytromino in place
-        blocks_pos = self._cur_pytromino.get_blocks_pos()
-        color = self._cur_pytromino.get_color()
-        for pos in blocks_pos:
-            if self._board.valid_coordinate(pos):
-                self._board[pos] = color
-            else:
-                self._game_over = True
-
-    def _check_row_clearance(self):
-        if self._game_over: return
-        unique_rows = self._cur_pytromino.get_unique_rows()
-        cleared_rows = []
-        # Figure out rows to be cleared
-        for row_index in unique_rows:
-            row = self._board.get_row(row_index)
-            empty_cells = [item for item in row if item == self._empty_cell_color]
-            if len(empty_cells) == 0:
-                cleared_rows.append(row_index)
-        # Clear the rows
-        for row_index in sorted(cleared_rows, reverse=True):
-            self._board.delete_row(row_index)
-        # Add new rows to top of the board
-        for _ in range(len(cleared_rows)):
-            self._board.insert_row_at(0, 
-                [self._empty_cell_color for _ in range(self._num_cols)])
-        if cleared_rows:
-            # Each cleared row is worth 100 points for now
-            self._increment_score_by(100 * len(cleared_rows))
-            # Redraw all board squares
+    def on_clearing(self, rows):
+        # Timed apart from the input or gravity that filled the rows, from
+        # clearing them on the board to redrawing it in on_clear
+        self._profiler.enter('clear')
+
+    def on_clear(self, rows):
+        # Redraw only the board squares that changed
+        dirty_rows, dirty_cells = self._board.flush_dirty()
+        for y in dirty_rows:
             for x in range(self._num_cols):
-                for y in range(self._num_rows):
-                    coord = (x, y)
-                    self._gui.draw_rectangle_in_main(
-                        coord, 
-                        self._board[coord]
-                    )
-            # Render display
-            self._gui.render()
-        
-
-    def _draw_cur_pytromino(self, color=None):
-        assert self._cur_pytromino.is_placed(), \
-            f'Current Pytromino not placed: {self._cur_pytromino}'
-        if not color:
-            color = self._cur_pytromino.get_color()
-
-        valid_blocks = self._cur_pytromino.filter_blocks_pos(
-            self._board.valid_coordinate
+                coord = (x, y)
+                self._gui.draw_rectangle_in_main(
+                    coord, 
+                    self._board[coord]
+                )
+        for coord in dirty_cells:
+            self._gui.draw_rectangle_in_main(coord, self._board[coord])
+        # Render display
+        self._render()
+        self._profiler.exit()
+
+    def on_hold(self, src_pos):
+        # Reflect the change on holder display
+        self._gui.init_pytro_holder()
+        self._draw_pytromino_preview(
+            self._gui.draw_rectangle_in_holder, self._game.get_held(), (1, 2)
         )
+        self._render()
+        # Coverup the current pytromino colors
+        self._gui.draw_rectangles_in(
+            PytrisViewManager.Grid.MID, src_pos, self._empty_cell_color
+        )
+        self._render()
+
+    def on_score(self, score):
+        self._gui.update_score(score)
+        self._render()
+
+# ============================================================================ #
+# =========================== Additional Functions =========================== #
+# ============================================================================ #
+
+    def _cur_pytromino(self):
+        return self._game.get_cur_pytromino()
 
+    def _draw_cur_pytromino(self):
+        assert self._cur_pytromino().is_placed(), \
+            f'Current Pytromino not placed: {self._cur_pytromino()}'
+        valid_blocks = self._cur_pytromino().filter_blocks_pos(
+            self._board.valid_coordinate
+        )
+        self._draw_ghost_pytromino()
         self._gui.draw_rectangles_in(
             PytrisViewManager.Grid.MID, 
             valid_blocks, 
-            color
+            self._cur_pytromino().get_color_index()
         )
         # For better UX, render rightaway
-        self._gui.render()
+        self._render()
 
-    def _cur_pytromino_block_validator(self, pos):
-        if pos[1] < 0:
-            return 0 <= pos[0] < self._num_cols
-        return self._board.valid_coordinate(pos) \
-            and self._board[pos] == self._empty_cell_color
-        
-    def _move_cur_pytromino(self, fn, is_rotation=False):
-        assert self._cur_pytromino.is_placed()
-        src_pos = self._cur_pytromino.filter_blocks_pos(
-            self._board.valid_coordinate
+    def _draw_ghost_pytromino(self):
+        """ Redraw the ghost piece at the landing position of the current
+            pytromino. The pytromino itself must be drawn afterwards
+        """
+        ghost_color = self._gui.get_ghost_color()
+        if ghost_color is None:
+            return
+        # Restore whatever the board holds under the previous ghost
+        for pos in self._ghost_pos:
+            self._gui.draw_rectangle_in_main(pos, self._board[pos])
+        blocks_pos = self._cur_pytromino().get_blocks_pos()
+        distance = self._board.drop_distance(blocks_pos)
+        self._ghost_pos = [
+            (x, y + distance) for x, y in blocks_pos
+            if self._board.valid_coordinate((x, y + distance))
+        ]
+        self._gui.draw_rectangles_in(
+            PytrisViewManager.Grid.MID, self._ghost_pos, ghost_color
         )
-        success = self._cur_pytromino.validated_apply(
-            fn, 
-            is_rotation,
-            validator=self._cur_pytromino_block_validator,
+
+    def _start_recording(self):
+        self._tick = 0
+        self._gravity_tick = 0
+        self._recorder = ReplayRecorder(
+            self._seed, self._randomizer_name, self._num_cols, self._num_rows,
+            self._num_nextup, self._pytro_start_coord, _TICK_RATE
         )
-        if success:
-            dest_pos = self._cur_pytromino.filter_blocks_pos(
-                self._board.valid_coordinate
-            )
-            self._gui.move_rectangles_in(
-                PytrisViewManager.Grid.MID, 
-                src_pos, 
-                dest_pos,
-                self._cur_pytromino.get_color()
-            )
-            # For better UX, render movement rightaway
-            self._gui.render()
-        return success
-        
-    def _handle_movements(self, key):
-        fn = None
-        is_rotation = False
+
+    def _input(self, action):
+        """ Apply action, None for a gravity tick, recording it at the
+            current logical tick
+        """
+        self._recorder.record(self._tick, action)
+        if action is None:
+            self._game.tick()
+            self._gravity_tick = self._tick
+        else:
+            self._game.step(action)
+            if action is Action.HARD_DROP:
+                # Give the next pytromino a full gravity interval
+                self._gravity_tick = self._tick
+
+    def _render(self):
+        self._profiler.enter('render')
+        self._gui.render()
+        self._profiler.exit()
+
+    def _handle_key(self, key):
         if key == K_DOWN:
-            fn = Pytromino.shift_down_fn(1)
+            self._input(Action.DOWN)
         elif key == K_LEFT:
-            fn = Pytromino.shift_left_fn(1)
+            self._input(Action.LEFT)
         elif key == K_RIGHT:
-            fn = Pytromino.shift_right_fn(1)
+            self._input(Action.RIGHT)
         elif key == K_UP:
-            is_rotation = True
-            fn = self._rotate_block_90_cw
-        else:
-            if key == K_f:
-                print(self._fps_clock.get_fps())
-            if key == K_b:
-                print(self._board)
-            return
-        success = self._move_cur_pytromino(fn, is_rotation)
-        if key == K_DOWN and success:
-            self._increment_score_by(1)
-
-    def _rotate_block_90_cw(self, pos):
-        res = self._cur_pytromino.rotate_block_90_cw(pos)
-        res = (int(res[0]), int(res[1]))
-        return res
-
-    def _increment_score_by(self, num):
-        self._score += num
-        self._gui.update_score(self._score)
-        self._gui.render()
-
-    def get_random_pytromino_t(self):
-        return choice(self._pytromino_types)
+            self._input(Action.ROTATE)
+        elif key == K_c:
+            self._input(Action.HOLD)
+        elif key == K_f:
+            print(self._fps_clock.get_fps())
+        elif key == K_b:
+            print(self._board)
+        elif key == K_p:
+            self._show_profile = not self._show_profile
+            if not self._show_profile:
+                self._gui.draw_overlay([])
+                self._render()
 
-    def _get_new_pytromino(self):
-        pytromino_t = self._nextup.popleft()
-        self._nextup.append(self.get_random_pytromino_t())
-
-        x = 1
-        y = 2
-        self._gui.init_pytro_nextup()
-        for i, t in enumerate(self._nextup):
-            center = (x, 4 * i + y)
-            display_pytro = pytromino_factory(t)
-            display_pytro.place_at(center)
-            for coord in display_pytro.get_blocks_pos():
-                self._gui.draw_rectangle_in_nextup(coord, display_pytro.get_color())
-        self._gui.render()
-        return pytromino_factory(pytromino_t)
-
-    def _hold_pytromino(self):
-        can_hold = self._holder.is_open()
-        if can_hold:
-            next_pytromino_t = self._holder.get_item()
-            if not next_pytromino_t: # holder is empty
-                # Reflect the change on holder display
-                self._gui.init_pytro_holder()
-                display_pytro = pytromino_factory(self._cur_pytromino.get_type())
-                display_pytro.place_at((1, 2))
-                for coord in display_pytro.get_blocks_pos():
-                    self._gui.draw_rectangle_in_holder(coord, display_pytro.get_color())
-                self._gui.render()
-
-                self._holder.store(self._cur_pytromino.get_type())
-                self._draw_cur_pytromino(self._empty_cell_color)
-                self._holder.close()
-                self._init_new_pytromino()
-            else: # switch cur_pytromino type with the one in holder
-                # 1. Make sure the switched pytromino can be placed
-                cur_pytromino_center = self._cur_pytromino.get_blocks_pos()[0]
-                next_pytromino = pytromino_factory(next_pytromino_t)
-                next_pytromino.place_at(cur_pytromino_center)
-                for pos in next_pytromino.get_blocks_pos():
-                    if not self._cur_pytromino_block_validator(pos):
-                        return False
-                # Reflect the change on holder display
-                self._gui.init_pytro_holder()
-                display_pytro = pytromino_factory(self._cur_pytromino.get_type())
-                display_pytro.place_at((1, 2))
-                for coord in display_pytro.get_blocks_pos():
-                    self._gui.draw_rectangle_in_holder(coord, display_pytro.get_color())
-                self._gui.render()
-                # Store the type
-                self._holder.store(self._cur_pytromino.get_type())
-                # Coverup the current pytromino colors
-                self._draw_cur_pytromino(self._empty_cell_color)
-                # Make the switch
-                self._cur_pytromino = next_pytromino
-                # Draw the replacement pytrominos
-                self._draw_cur_pytromino()
-                self._gui.render()
-                # Close holder
-                self._holder.close()
-        return can_hold
+    def _draw_pytromino_preview(self, draw_fn, pytromino_t, center):
+        # Previews are drawn straight from the shared shape, no instance needed
+        shape = SHAPES[pytromino_t]
+        for dx, dy in shape.blocks:
+            draw_fn((center[0] + dx, center[1] + dy), shape.color_index)
@@ -1,11 +1,22 @@
+from collections import namedtuple
 from enum import Enum, auto
+from functools import lru_cache
 from colors import Color
+from zobrist import zobrist_key
 
 
 class Pytromino:
     """An object to represent a block of squares
+
+    A Pytromino only holds a reference to its shared, immutable
+    PytrominoShape, a rotation index and the origin (the position of the
+    reference block before any rotation). Block positions are derived from
+    the shape's rotation table on demand.
     """
 
+    __slots__ = ('_shape', '_rotation', '_origin', '_placed', '_blocks',
+                 '_hash', '_hashes')
+
     class Types(Enum):
         I = auto()
         O = auto()
@@ -37,12 +48,31 @@ class Pytromino:
         """
         assert isinstance(pytromino_type, Pytromino.Types)
         assert type(color) == tuple
-        self._blocks_pos = block_rel_pos
-        self._color = color
-        self._type = pytromino_type
-        self._center_rot = center_rot
+        self._init_state(_make_shape(
+            pytromino_type, tuple(map(tuple, block_rel_pos)), color,
+            tuple(center_rot)
+        ))
+
+    @classmethod
+    def from_shape(cls, shape):
+        """ Create a new, unplaced Pytromino of a PytrominoShape
+        """
+        pytromino = cls.__new__(cls)
+        pytromino._init_state(shape)
+        return pytromino
+
+    def _init_state(self, shape):
+        self._shape = shape
+        self._rotation = 0
+        self._origin = (0, 0)
         self._placed = False
-        
+        # Explicit block positions, only set when they can not be derived
+        # from the rotation table, e.g. after validated_apply with floats
+        self._blocks = None if shape.rotations else list(shape.blocks)
+        self._hash = self._hash_blocks(shape.blocks)
+        # Hashes by (rotation, origin), shared by the pytrominos of the shape
+        self._hashes = _piece_hashes(shape)
+
 
 # ---------------------------------------------------------------------------- #
 # ----------------------------- Required Methods ----------------------------- #
@@ -70,8 +100,9 @@ class Pytromino:
         >>> T.rotate_block_90_cw((1, 0))
         (0, 1)
         """
-        x = self._center_rot[1] - pos[1] + self._center_rot[0]
-        y = pos[0] - self._center_rot[0] + self._center_rot[1]
+        center_rot = self._get_center_rot()
+        x = center_rot[1] - pos[1] + center_rot[0]
+        y = pos[0] - center_rot[0] + center_rot[1]
         newpos = (x, y)
         return(newpos)
 
@@ -101,7 +132,7 @@ class Pytromino:
         >>> S.filter_blocks_pos(lambda pos: pos[0] * pos[1] < 0)
         [(1, -1)]
         """
-        return([x for x in self._blocks_pos if fn(x) == True])
+        return([x for x in self._get_blocks() if fn(x) == True])
 
 
     @staticmethod
@@ -229,21 +260,163 @@ class Pytromino:
         >>> I # Notice center_pos is NOT changed --------------------------------------------- below
         <Pytromino [(1.0, 0.0), (1.0, -1.0), (1.0, 1.0), (1.0, 2.0)], (43, 172, 226), Types.I, (0.5, 0.5) >
         """
-        y = [fn(x) for x in self._blocks_pos]
-        for i in range(0, len(self._blocks_pos)):
+        blocks_pos = self._get_blocks()
+        y = [fn(x) for x in blocks_pos]
+        for i in range(0, len(blocks_pos)):
             if validator(y[i]) == False:
                 return(False)
-        self._blocks_pos = y
         if is_rotation == False:
-            self._center_rot = fn(self._center_rot)
-        for i in range(0, len(self._blocks_pos)):
-            if validator(self._blocks_pos[i]) == False:
-                return(False)
+            self._origin = fn(self._origin)
         else:
-            return(True)
+            self._rotation = self._match_rotation(y)
+        self._blocks = None
+        if self._blocks_derived() != y \
+                or any(type(v) is not int for pos in y for v in pos):
+            self._blocks = y
+        self._hash = self._hash_blocks(y)
+        return(True)
+
 
 
 
+    def rotate_90_cw(self, validator=lambda pos: True):
+        """ Rotate this pytromino by 90 degrees clockwise using its
+            precomputed rotation table, with the same effect and validation
+            as validated_apply(self.rotate_block_90_cw, True, validator)
+            but with integer coordinates and no float math. Falls back to
+            validated_apply when the rotations of this shape are not
+            integral
+
+        >>> I = pytromino_factory(Pytromino.Types.I)
+        >>> I.place_at((4, 0))
+        >>> I.rotate_90_cw()
+        True
+        >>> I
+        <Pytromino [(5, 0), (5, -1), (5, 1), (5, 2)], (43, 172, 226), Types.I, (4.5, 0.5) >
+        >>> I.rotate_90_cw(lambda pos: pos[0] < 5)
+        False
+        """
+        rotations = self._shape.rotations
+        if rotations is None or self._rotation is None:
+            return self.validated_apply(self.rotate_block_90_cw, True, validator)
+        rotation = (self._rotation + 1) % 4
+        ox, oy = self._origin
+        for dx, dy in rotations[rotation]:
+            if not validator((ox + dx, oy + dy)):
+                return False
+        self._rotation = rotation
+        self._blocks = None
+        self._hash = self._hash_at(rotation, ox, oy)
+        return True
+
+    def try_move(self, dx, dy, drot, board):
+        """ Shift this pytromino by (dx, dy) and rotate it drot times 90
+            degrees clockwise, as a single move. The move is only made when
+            every resulting block fits on board (see Board.fits_at), in which
+            case True is returned. Else, no effect will occur and False will
+            be returned. The blocks are checked in one pass, and no closure
+            or list is created
+
+        Parameters
+        ----------
+        dx, dy (int):
+            Number of steps to shift right and down, may be negative
+
+        drot (int):
+            Number of 90 degree clockwise rotations, applied around the
+            center of rotation before the shift
+
+        board (Board):
+            The board the blocks are checked against
+
+        >>> from board import Board
+        >>> board = Board(4, 4, 0, grid=[0] * 12 + [1, 0, 0, 0])
+        >>> T = pytromino_factory(Pytromino.Types.T)
+        >>> T.place_at((1, 1))
+        >>> T.try_move(0, 1, 0, board)
+        True
+        >>> T
+        <Pytromino [(1, 2), (1, 1), (0, 2), (2, 2)], (146, 44, 140), Types.T, (1, 2) >
+        >>> T.try_move(0, 1, 0, board), T.try_move(-1, 0, 0, board)
+        (False, False)
+        >>> T.try_move(1, 0, 1, board)
+        True
+        >>> T
+        <Pytromino [(2, 2), (3, 2), (2, 1), (2, 3)], (146, 44, 140), Types.T, (2, 2) >
+        """
+        rotations = self._shape.rotations
+        ox, oy = self._origin
+        if rotations is None or self._rotation is None:
+            return self._try_move_blocks(dx, dy, drot, board)
+        rotation = (self._rotation + drot) % 4
+        if not board.fits_at(rotations[rotation], ox + dx, oy + dy):
+            return False
+        origin = self._origin = (ox + dx, oy + dy)
+        self._rotation = rotation
+        self._blocks = None
+        piece_hash = self._hashes.get((rotation, origin))
+        self._hash = piece_hash if piece_hash is not None \
+            else self._hash_at(rotation, *origin)
+        return True
+
+    def _try_move_blocks(self, dx, dy, drot, board):
+        # Slow path for shapes without an integral rotation table
+        blocks_pos = self._get_blocks()
+        for _ in range(drot % 4):
+            blocks_pos = [self.rotate_block_90_cw(pos) for pos in blocks_pos]
+        blocks_pos = [(x + dx, y + dy) for x, y in blocks_pos]
+        if not board.fits(blocks_pos):
+            return False
+        self._origin = (self._origin[0] + dx, self._origin[1] + dy)
+        self._rotation = self._match_rotation(blocks_pos)
+        self._blocks = blocks_pos
+        self._hash = self._hash_blocks(blocks_pos)
+        return True
+
+    def get_rotation(self):
+        """ Returns the index of the current rotation state in the rotation
+            table, None if the blocks match no state
+        """
+        return self._rotation
+
+    def get_origin(self):
+        """ Returns the position of the reference block before rotation, the
+            origin of movegen.Placement
+        """
+        return self._origin
+
+    def _match_rotation(self, blocks_pos):
+        if self._shape.rotations is None:
+            return None
+        ox, oy = self._origin
+        rel_pos = tuple((x - ox, y - oy) for x, y in blocks_pos)
+        for rotation, table_pos in enumerate(self._shape.rotations):
+            if rel_pos == table_pos:
+                return rotation
+        return None
+
+    def _get_blocks(self):
+        """ Returns the block positions, do not modify the result
+        """
+        if self._blocks is not None:
+            return self._blocks
+        ox, oy = self._origin
+        return [(ox + dx, oy + dy)
+                for dx, dy in self._shape.rotations[self._rotation]]
+
+    def _blocks_derived(self):
+        """ Returns the block positions given by the rotation table, None if
+            the rotation state is unknown
+        """
+        if self._shape.rotations is None or self._rotation is None:
+            return None
+        ox, oy = self._origin
+        return [(ox + dx, oy + dy)
+                for dx, dy in self._shape.rotations[self._rotation]]
+
+    def _get_center_rot(self):
+        center_rot = self._shape.center_rot
+        return (self._origin[0] + center_rot[0], self._origin[1] + center_rot[1])
 
 # ---------------------------------------------------------------------------- #
 # --------------------------- Helpers: Not Required -------------------------- #
@@ -253,7 +426,7 @@ class Pytromino:
         """ Returns a list of rows spanned by this pytromino
         """
         s = set()
-        for pos in self._blocks_pos:
+        for pos in self._get_blocks():
             s.add(pos[1])
         return list(s)
 
@@ -279,52 +452,149 @@ class Pytromino:
     def get_blocks_pos(self):
         """ Returns a COPY of blocks_pos
         """
-        return self._blocks_pos[:]
+        return self._get_blocks()[:]
 
     def get_color(self):
         """ Returns the color of the Pytromino
         """
-        return self._color
+        return self._shape.color
+
+    def get_color_index(self):
+        """ Returns the palette index of the color of the Pytromino
+
+        >>> pytromino_factory(Pytromino.Types.Z).get_color_index() == Color.RED.index
+        True
+        """
+        return self._shape.color_index
 
     def get_type(self):
-        return self._type
+        return self._shape.type
+
+    def get_shape(self):
+        return self._shape
+
+    def zobrist_hash(self):
+        """ Returns the 64-bit Zobrist hash of this pytromino's type and
+            block positions, kept up to date by every move. XOR it with
+            Board.zobrist_hash() to get the hash of a whole game position
+
+        >>> from board import Board
+        >>> a = pytromino_factory(Pytromino.Types.T)
+        >>> b = pytromino_factory(Pytromino.Types.T)
+        >>> a.place_at((4, 1)); b.place_at((3, 1))
+        >>> a.zobrist_hash() == b.zobrist_hash()
+        False
+        >>> b.validated_apply(Pytromino.shift_right_fn(1))
+        True
+        >>> a.zobrist_hash() == b.zobrist_hash()
+        True
+        >>> a.rotate_90_cw(); b.try_move(0, 0, 1, Board(10, 4, 0))
+        True
+        True
+        >>> a.zobrist_hash() == b.zobrist_hash()
+        True
+        """
+        return self._hash
+
+    def _hash_blocks(self, blocks_pos):
+        piece_hash = zobrist_key('piece', self._shape.type.name)
+        for x, y in blocks_pos:
+            piece_hash ^= zobrist_key('block', int(x), int(y))
+        return piece_hash
+
+    def _hash_at(self, rotation, x, y):
+        # The hash in rotation with its origin at (x, y), computed once per shape
+        key = (rotation, (x, y))
+        piece_hash = self._hashes.get(key)
+        if piece_hash is None:
+            piece_hash = self._hashes[key] = self._hash_blocks(
+                (x + dx, y + dy) for dx, dy in self._shape.rotations[rotation]
+            )
+        return piece_hash
 
     def __repr__(self):
-        return f"<Pytromino {self._blocks_pos}, {self._color}, {self._type}, {self._center_rot} >"
+        return f"<Pytromino {self._get_blocks()}, {self._shape.color}, {self._shape.type}, {self._get_center_rot()} >"
+
+PytrominoShape = namedtuple('PytrominoShape', [
+    'type',         # Pytromino.Types
+    'blocks',       # block positions relative to the reference block
+    'color',        # RGB color
+    'color_index',  # palette index of color, None if color is not a Color
+    'center_rot',   # center of rotation relative to the reference block
+    'rotations',    # 4 rotation states, see _rotation_table, or None
+])
+
+@lru_cache(maxsize=None)
+def _rotation_table(block_rel_pos, center_rot):
+    """ Returns the block positions of all 4 rotation states of a shape as
+        integer offsets from the reference block's starting position,
+        state 0 being block_rel_pos itself. The table is computed once per
+        shape and shared by every pytromino of that shape. Returns None if
+        a rotated position is not integral
+
+    >>> _rotation_table(((0, 0), (-1, 0), (1, 0), (2, 0)), (0.5, 0.5))[1]
+    ((1, 0), (1, -1), (1, 1), (1, 2))
+    >>> _rotation_table(((0, 0), (1, 0)), (0.25, 0)) is None
+    True
+    """
+    cx, cy = center_rot
+    states = [tuple(block_rel_pos)]
+    for _ in range(3):
+        rotated = []
+        for x, y in states[-1]:
+            new_x, new_y = cy - y + cx, x - cx + cy
+            if new_x != int(new_x) or new_y != int(new_y):
+                return None
+            rotated.append((int(new_x), int(new_y)))
+        states.append(tuple(rotated))
+    return tuple(states)
+
+
+@lru_cache(maxsize=None)
+def _piece_hashes(shape):
+    """ Returns the dict of piece hashes shared by the pytrominos of shape
+    """
+    return {}
+
+
+@lru_cache(maxsize=None)
+def _make_shape(pytromino_type, blocks, color, center_rot):
+    """ Returns the PytrominoShape of these arguments, identical arguments
+        share a single shape
+    """
+    color_index = Color(color).index \
+        if color in Color._value2member_map_ else None
+    return PytrominoShape(pytromino_type, blocks, color, color_index,
+                          center_rot, _rotation_table(blocks, center_rot))
+
+
+SHAPES = {
+    pytromino_type: _make_shape(pytromino_type, blocks, color.value, center_rot)
+    for pytromino_type, blocks, color, center_rot in (
+        (Pytromino.Types.I, ((0, 0), (-1, 0), (1, 0), (2, 0)), Color.CYAN, (0.5, 0.5)),
+        (Pytromino.Types.O, ((0, 0), (0, -1), (1, -1), (1, 0)), Color.YELLOW, (0.5, -0.5)),
+        (Pytromino.Types.L, ((0, 0), (-1, 0), (1, 0), (1, -1)), Color.ORANGE, (0, 0)),
+        (Pytromino.Types.S, ((0, 0), (-1, 0), (0, -1), (1, -1)), Color.GREEN, (0, 0)),
+        (Pytromino.Types.T, ((0, 0), (0, -1), (-1, 0), (1, 0)), Color.PURPLE, (0, 0)),
+        (Pytromino.Types.J, ((0, 0), (-1, -1), (-1, 0), (1, 0)), Color.BLUE, (0, 0)),
+        (Pytromino.Types.Z, ((0, 0), (0, -1), (-1, -1), (1, 0)), Color.RED, (0, 0)),
+    )
+}
+
 
 def pytromino_factory(pytromino_type):
-    if pytromino_type == Pytromino.Types.I: # cyan
-        return Pytromino([(0, 0), (-1, 0), (1, 0), (2, 0)],
-                    Color.CYAN.value,
-                    pytromino_type,
-                    center_rot=(0.5, 0.5))
-    elif pytromino_type == Pytromino.Types.O: # yellow
-        return Pytromino([(0, 0), (0, -1), (1, -1), (1, 0)],
-                    Color.YELLOW.value,
-                    pytromino_type,
-                    center_rot=(0.5, -0.5))
-    elif pytromino_type == Pytromino.Types.L: # orange
-        return Pytromino([(0, 0), (-1, 0), (1, 0), (1, -1)],
-                    Color.ORANGE.value,
-                    pytromino_type)
-    elif pytromino_type == Pytromino.Types.S: # green
-        return Pytromino([(0, 0), (-1, 0), (0, -1), (1, -1)],
-                    Color.GREEN.value,
-                    pytromino_type)
-    elif pytromino_type == Pytromino.Types.T: # purple
-        return Pytromino([(0, 0), (0, -1), (-1, 0), (1, 0)],
-                    Color.PURPLE.value,
-                    pytromino_type)
-    elif pytromino_type == Pytromino.Types.J: # blue
-        return Pytromino([(0, 0), (-1, -1), (-1, 0), (1, 0)],
-                    Color.BLUE.value,
-                    pytromino_type)
-    elif pytromino_type == Pytromino.Types.Z: # red
-        return Pytromino([(0, 0), (0, -1), (-1, -1), (1, 0)],
-                    Color.RED.value,
-                    pytromino_type)
-    else:
+    """ Create a new Pytromino of pytromino_type from its shared shape
+
+    >>> T = pytromino_factory(Pytromino.Types.T)
+    >>> T
+    <Pytromino [(0, 0), (0, -1), (-1, 0), (1, 0)], (146, 44, 140), Types.T, (0, 0) >
+    >>> T.get_shape() is pytromino_factory(Pytromino.Types.T).get_shape()
+    True
+    """
+    shape = SHAPES.get(pytromino_type)
+    if shape is None:
         raise ValueError(f'Unknown block type: "{pytromino_type}"')
+    return Pytromino.from_shape(shape)
 
 
 class Holder:
@@ -0,0 +1,250 @@
+""" Move generation: every final resting position a pytromino can reach on a
+    Board with the player's move set (left, right, down and 90 degree
+    clockwise rotation), including tucks under overhangs and spins.
+
+    The search is a breadth first search over (x, y, rotation) states of the
+    pytromino's reference block, done row by row since no move goes up. The
+    visited states of a row are one bit mask of columns per rotation, and a
+    whole layer of the search is a few shifts of those masks against the
+    columns where the piece fits, which come from the board's row masks
+    (Board.get_row_mask) and the shared rotation tables of models.SHAPES.
+    A state is resting when moving it down does not fit. The rules are
+    those of Board.fits and Pytromino.try_move.
+"""
+from collections import deque, namedtuple
+from enum import Enum
+from functools import lru_cache
+from models import SHAPES
+
+Placement = namedtuple('Placement', [
+    'type',      # Pytromino.Types
+    'rotation',  # index into the rotation table of the shape
+    'origin',    # (x, y) of the reference block before rotation
+    'blocks',    # sorted tuple of the (x, y) block positions
+    'path',      # tuple of Move, a way there from the spawn, or None
+])
+
+
+class Move(Enum):
+    """ The player's moves, valued (dx, dy, drot) as taken by
+        Pytromino.try_move
+    """
+    LEFT = (-1, 0, 0)
+    RIGHT = (1, 0, 0)
+    DOWN = (0, 1, 0)
+    ROTATE = (0, 0, 1)
+
+
+def generate_placements(board, pytromino_type, spawn=(4, 0), paths=True,
+                        rotation=0):
+    """ Find every distinct final resting position of a pytromino_type
+        pytromino placed at spawn on board. Positions are distinct by the
+        cells they cover, so e.g. the rotations of an O pytromino only count
+        once. Blocks of a placement may stick out above the board (y < 0)
+
+    Parameters
+    ----------
+    board (Board):
+        The board to search on, it is not modified
+
+    pytromino_type (Pytromino.Types):
+        The type of the pytromino to place
+
+    spawn ((int, int)):
+        Where the pytromino starts, as for Pytromino.place_at.
+        Default (4, 0) where PytrisController spawns pytrominos
+
+    paths (bool):
+        Whether to trace the path of every placement, else their path is
+        None. Searches that only need the placements should skip them
+
+    rotation (int):
+        The rotation the pytromino starts in, e.g. to search from where a
+        pytromino already is (Pytromino.get_origin and get_rotation).
+        Default 0
+
+    Returns
+    -------
+    list[Placement]
+        Ordered by row, rotation and column of the reference block, empty
+        when the pytromino does not fit at spawn
+
+    >>> from board import Board
+    >>> from models import Pytromino
+    >>> board = Board(4, 4, 0)
+    >>> placements = generate_placements(board, Pytromino.Types.O, spawn=(1, 1))
+    >>> [p.blocks for p in placements]
+    [((0, 2), (0, 3), (1, 2), (1, 3)), ((1, 2), (1, 3), (2, 2), (2, 3)), ((2, 2), (2, 3), (3, 2), (3, 3))]
+    >>> placements[0].path
+    (<Move.LEFT: (-1, 0, 0)>, <Move.DOWN: (0, 1, 0)>, <Move.DOWN: (0, 1, 0)>)
+    >>> board = Board(5, 4, 0, grid=[0, 0, 0, 0, 0,
+    ...                              1, 1, 0, 0, 0,
+    ...                              0, 0, 0, 0, 0,
+    ...                              0, 0, 0, 0, 0])
+    >>> placements = generate_placements(board, Pytromino.Types.O, spawn=(3, 0))
+    >>> [p.blocks[0] for p in placements]
+    [(0, -1), (1, -1), (0, 2), (1, 2), (2, 2), (3, 2)]
+    >>> tuck = placements[2] # under the overhang
+    >>> [move.name for move in tuck.path]
+    ['LEFT', 'DOWN', 'DOWN', 'DOWN', 'LEFT', 'LEFT']
+    """
+    shape = SHAPES.get(pytromino_type)
+    if shape is None:
+        raise ValueError(f'Unknown block type: "{pytromino_type}"')
+    layers, resting = _search(board, shape, spawn, rotation)
+    return [
+        Placement(pytromino_type, r, (x, y), blocks,
+                  _trace_path(layers, spawn[1], x, y, r) if paths else None)
+        for blocks, (x, y, r) in resting.items()
+    ]
+
+
+def find_path(board, placement, spawn=(4, 0), rotation=0):
+    """ Returns the path to placement, as generate_placements would trace it
+        with the same arguments, or None when it is not reachable. Cheaper
+        than tracing every path when only a few are needed
+
+    >>> from board import Board
+    >>> from models import Pytromino
+    >>> board = Board(4, 4, 0)
+    >>> placements = generate_placements(board, Pytromino.Types.O, spawn=(1, 1),
+    ...                                  paths=False)
+    >>> [move.name for move in find_path(board, placements[2], spawn=(1, 1))]
+    ['RIGHT', 'DOWN', 'DOWN']
+    """
+    shape = SHAPES.get(placement.type)
+    if shape is None:
+        raise ValueError(f'Unknown block type: "{placement.type}"')
+    layers, resting = _search(board, shape, spawn, rotation)
+    if placement.blocks not in resting:
+        return None
+    x, y, r = resting[placement.blocks]
+    return _trace_path(layers, spawn[1], x, y, r)
+
+
+# Pytromino blocks are at most this far from their reference block
+_PAD = 4
+
+
+@lru_cache(maxsize=None)
+def _piece_masks(shape):
+    """ Returns for every rotation of shape the mask of the columns its
+        reference block may be in, and the (dy, shift) of every block such
+        that the board row mask of row y + dy shifted by shift has the
+        columns set where that block collides
+    """
+    assert shape.rotations is not None, f'Shape without rotation table: {shape}'
+    piece = []
+    for offsets in shape.rotations:
+        assert all(abs(dx) <= _PAD and abs(dy) <= _PAD for dx, dy in offsets)
+        min_dx = min(dx for dx, _ in offsets)
+        max_dx = max(dx for dx, _ in offsets)
+        # Bit x + _PAD with x + min_dx >= 0 and x + max_dx < num_cols
+        # depends on num_cols, so store the range and build it in _fit_masks
+        piece.append((min_dx, max_dx,
+                      tuple((dy, _PAD - dx) for dx, dy in offsets)))
+    return tuple(piece)
+
+
+def _fit_masks(piece, masks, y, num_cols):
+    """ Returns for every rotation the state mask of the columns where the
+        piece fits with its reference block in row y
+    """
+    num_rows = len(masks)
+    fits = []
+    for min_dx, max_dx, blocks in piece:
+        fit = ((1 << (num_cols - max_dx + _PAD)) - 1) \
+            & ~((1 << (_PAD - min_dx)) - 1)
+        for dy, shift in blocks:
+            row = y + dy
+            if row >= num_rows:
+                fit = 0
+                break
+            if row >= 0:
+                fit &= ~(masks[row] << shift)
+        fits.append(fit)
+    return fits
+
+
+def _search(board, shape, spawn, rotation):
+    """ The breadth first search of generate_placements. Returns its layers
+        and the first state found of every resting position by its sorted
+        blocks
+    """
+    piece = _piece_masks(shape)
+    num_cols, num_rows = board.get_num_cols(), board.get_num_rows()
+    spawn_x, spawn_y = spawn
+    masks = [board.get_row_mask(y) for y in range(num_rows)]
+    # Column x is bit x + _PAD of the state masks
+    spawn_bit = 1 << (spawn_x + _PAD)
+    fits = _fit_masks(piece, masks, spawn_y, num_cols)
+    # layers[y - spawn_y][k][rotation]: the states of row y first reached
+    # after k moves within the row, layer 0 is entered from the row above
+    layers = []
+    resting = {}
+    if not fits[rotation] & spawn_bit:
+        return layers, resting
+    entry = tuple(spawn_bit if r == rotation else 0 for r in range(4))
+    y = spawn_y
+    while any(entry):
+        seen = list(entry)
+        row_layers = [entry]
+        frontier = entry
+        while True:
+            frontier = tuple(
+                (frontier[r] << 1 | frontier[r] >> 1 | frontier[r - 1])
+                & fits[r] & ~seen[r]
+                for r in range(4)
+            )
+            if not any(frontier):
+                break
+            row_layers.append(frontier)
+            for r in range(4):
+                seen[r] |= frontier[r]
+        layers.append(row_layers)
+        next_fits = _fit_masks(piece, masks, y + 1, num_cols)
+        for r in range(4):
+            rest = seen[r] & ~next_fits[r]
+            while rest:
+                bit = rest & -rest
+                rest ^= bit
+                x = bit.bit_length() - 1 - _PAD
+                blocks = tuple(sorted(
+                    (x + dx, y + dy) for dx, dy in shape.rotations[r]
+                ))
+                resting.setdefault(blocks, (x, y, r))
+        entry = tuple(seen[r] & next_fits[r] for r in range(4))
+        fits = next_fits
+        y += 1
+    return layers, resting
+
+
+def _trace_path(layers, spawn_y, x, y, rotation):
+    """ Walk back from state (x, y, rotation) to the spawn through the
+        layers of generate_placements, one move per layer
+    """
+    path = []
+    bit = 1 << (x + _PAD)
+    while True:
+        row_layers = layers[y - spawn_y]
+        k = 0
+        while not row_layers[k][rotation] & bit:
+            k += 1
+        if k == 0:
+            if y == spawn_y:
+                break
+            path.append(Move.DOWN)
+            y -= 1
+            continue
+        previous = row_layers[k - 1]
+        if previous[rotation] & bit << 1:
+            path.append(Move.LEFT)
+            bit <<= 1
+        elif previous[rotation] & bit >> 1:
+            path.append(Move.RIGHT)
+            bit >>= 1
+        else:
+            path.append(Move.ROTATE)
+            rotation = (rotation - 1) & 3
+    path.reverse()
+    return tuple(path)
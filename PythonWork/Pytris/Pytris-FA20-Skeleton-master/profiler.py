@@ -0,0 +1,177 @@
+""" Per frame timings of the phases of the game loop, to find out what makes
+    a frame take long.
+
+    PytrisController marks where every phase of a frame starts and stops.
+    Phases nest, e.g. rendering happens while handling input, and every
+    phase is only charged its own time, without the phases inside it. The
+    times of the last frames are kept in ring buffers, from which the
+    overlay (P key), the periodic log line and the CSV dump are made.
+"""
+import csv
+import time
+
+# In the order of the game loop. wait is the time spent in Clock.tick
+# sleeping until the next frame, frame the time of the whole frame
+PHASES = ('events', 'input', 'gravity', 'clear', 'render', 'wait')
+
+
+class FrameProfiler:
+    """
+    >>> profiler = FrameProfiler(size=4)
+    >>> for _ in range(6):
+    ...     profiler.start_frame()
+    ...     profiler.enter('input')
+    ...     profiler.enter('render')
+    ...     profiler.exit()
+    ...     profiler.exit()
+    ...     profiler.end_frame()
+    >>> profiler.get_num_frames(), len(profiler.get_times('render'))
+    (6, 4)
+    >>> sorted(profiler.stats())
+    ['clear', 'events', 'frame', 'gravity', 'input', 'render', 'wait']
+    """
+
+    def __init__(self, size=600, log_interval=None, csv_path=None,
+                 clock=time.perf_counter):
+        """
+        Parameters
+        ----------
+        size : int
+            Number of frames kept. Default 600, 10 seconds at 60 FPS
+
+        log_interval : float
+            Seconds between log lines printed by end_frame. Default None to
+            not log
+
+        csv_path : str
+            File to write the kept frames to on close(). Default None to not
+            write them
+
+        clock : () -> float
+            Returns the time in seconds. Default time.perf_counter
+        """
+        assert size > 0, f'Invalid size: {size}'
+        self._size = size
+        self._log_interval = log_interval
+        self._csv_path = csv_path
+        self._clock = clock
+        self._columns = PHASES + ('frame',)
+        self._times = {column: [0.0] * size for column in self._columns}
+        self._num_frames = 0
+        self._current = dict.fromkeys(PHASES, 0.0)
+        self._stack = []
+        self._mark = None
+        self._frame_start = None
+        self._last_log = None
+
+# --------------------------------- Open APIs -------------------------------- #
+
+    def start_frame(self):
+        now = self._clock()
+        if self._last_log is None:
+            self._last_log = now
+        # Leave out anything timed between frames
+        for phase in self._current:
+            self._current[phase] = 0.0
+        self._frame_start = now
+        self._mark = now
+
+    def enter(self, phase):
+        """ Start phase, pausing the phase it is in until exit()
+        """
+        now = self._clock()
+        if self._stack:
+            self._current[self._stack[-1]] += now - self._mark
+        self._stack.append(phase)
+        self._mark = now
+
+    def exit(self):
+        """ Stop the phase last entered, resuming the one it is in
+        """
+        now = self._clock()
+        self._current[self._stack.pop()] += now - self._mark
+        self._mark = now
+
+    def end_frame(self):
+        """ Store the times of the frame, and print the log line when it is
+            time to
+        """
+        assert not self._stack, f'Phases not exited: {self._stack}'
+        now = self._clock()
+        i = self._num_frames % self._size
+        for phase, seconds in self._current.items():
+            self._times[phase][i] = seconds
+            self._current[phase] = 0.0
+        self._times['frame'][i] = now - self._frame_start
+        self._num_frames += 1
+        if self._log_interval is not None \
+                and now - self._last_log >= self._log_interval:
+            self._last_log = now
+            print(self.log_line())
+
+    def close(self):
+        """ Write the kept frames to csv_path, if any
+        """
+        if self._csv_path is not None:
+            self.dump_csv(self._csv_path)
+
+    def get_num_frames(self):
+        """ Returns the number of frames ended so far
+        """
+        return self._num_frames
+
+    def get_times(self, column):
+        """ Returns the seconds of column, a phase or 'frame', of the kept
+            frames, oldest first
+        """
+        times = self._times[column]
+        if self._num_frames <= self._size:
+            return times[:self._num_frames]
+        i = self._num_frames % self._size
+        return times[i:] + times[:i]
+
+    def stats(self):
+        """ Returns for every phase and 'frame' the mean, 95th percentile
+            and max in seconds over the kept frames
+        """
+        stats = {}
+        for column in self._columns:
+            times = sorted(self.get_times(column))
+            if not times:
+                stats[column] = (0.0, 0.0, 0.0)
+                continue
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            stats[column] = (sum(times) / len(times), p95, times[-1])
+        return stats
+
+    def overlay_lines(self):
+        """ Returns the lines of text of the overlay, in milliseconds
+        """
+        stats = self.stats()
+        mean = stats['frame'][0]
+        lines = [f'{1 / mean if mean else 0:5.1f} fps   mean  p95   max']
+        for column in self._columns:
+            lines.append(f'{column:<8} ' + ' '.join(
+                f'{seconds * 1000:5.2f}' for seconds in stats[column]
+            ))
+        return lines
+
+    def log_line(self):
+        """ Returns a line of the mean and max milliseconds of every phase
+        """
+        stats = self.stats()
+        return 'frames {} | '.format(self._num_frames) + ' | '.join(
+            f'{column} {mean * 1000:.2f}/{top * 1000:.2f}'
+            for column, (mean, _, top) in stats.items()
+        ) + ' ms (mean/max)'
+
+    def dump_csv(self, path):
+        """ Write the kept frames to path, one row per frame in milliseconds
+        """
+        columns = [self.get_times(column) for column in self._columns]
+        first = self._num_frames - len(columns[0])
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('frame',) + tuple(f'{c}_ms' for c in self._columns))
+            for i, row in enumerate(zip(*columns)):
+                writer.writerow([first + i] + [f'{t * 1000:.4f}' for t in row])
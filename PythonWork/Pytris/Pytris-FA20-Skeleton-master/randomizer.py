@@ -0,0 +1,94 @@
+""" Generators of the sequence of pytromino types, each drawing from its own
+    random.Random so that games never share or disturb each other's state.
+
+    A randomizer is called with no arguments and returns the next type, as
+    engine.PytrisGame expects. Types are generated a block at a time and
+    handed out from a queue, so most calls are a single popleft().
+"""
+from collections import deque
+from random import Random
+from models import Pytromino
+
+
+class UniformRandomizer:
+    """ Every type is equally likely every time, independently of the
+        previous ones. Gives the same sequence as calling rng.choice(types)
+        repeatedly
+
+    >>> randomizer = UniformRandomizer(Random(1))
+    >>> rng = Random(1)
+    >>> [randomizer() for _ in range(100)] == \\
+    ...     [rng.choice(list(Pytromino.Types)) for _ in range(100)]
+    True
+    """
+
+    def __init__(self, rng=None, types=None, block_size=64):
+        """
+        Parameters
+        ----------
+        rng : random.Random
+            Source of randomness. Defaults to a new, randomly seeded one
+
+        types : list[Pytromino.Types]
+            The types to draw from. Defaults to all of them
+
+        block_size : int
+            Number of types generated at once
+        """
+        assert block_size > 0
+        self._rng = rng if rng is not None else Random()
+        self._types = list(types) if types is not None else list(Pytromino.Types)
+        self._block_size = block_size
+        self._queue = deque()
+
+    def __call__(self):
+        if not self._queue:
+            self._queue.extend(self._next_block())
+        return self._queue.popleft()
+
+    def _next_block(self):
+        choice, types = self._rng.choice, self._types
+        return [choice(types) for _ in range(self._block_size)]
+
+
+class BagRandomizer(UniformRandomizer):
+    """ The 7-bag: types are dealt from a shuffled bag holding each of them
+        once, and the bag is refilled when empty. Every type comes up once
+        in each group of 7 pytrominos, and never more than 12 apart
+
+    >>> randomizer = BagRandomizer(Random(1))
+    >>> set(randomizer() for _ in range(7)) == set(Pytromino.Types)
+    True
+    """
+
+    def __init__(self, rng=None, types=None, block_size=8):
+        """ As for UniformRandomizer, except that block_size is the number of
+            bags generated at once
+        """
+        super().__init__(rng, types, block_size)
+
+    def _next_block(self):
+        block = []
+        for _ in range(self._block_size):
+            bag = self._types[:]
+            self._rng.shuffle(bag)
+            block.extend(bag)
+        return block
+
+
+RANDOMIZERS = {
+    'uniform': UniformRandomizer,
+    '7bag': BagRandomizer,
+}
+
+
+def make_randomizer(name, rng=None):
+    """ Returns a new randomizer of RANDOMIZERS by name drawing from rng
+
+    >>> type(make_randomizer('7bag', Random(0))).__name__
+    'BagRandomizer'
+    """
+    randomizer_class = RANDOMIZERS.get(name)
+    if randomizer_class is None:
+        raise ValueError(f'Unknown randomizer: "{name}"')
+    return randomizer_class(rng)
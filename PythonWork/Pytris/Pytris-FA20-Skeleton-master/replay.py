@@ -0,0 +1,238 @@
+""" Replays of Pytris games: everything needed to play a game again exactly,
+    for bug reports and regression checks.
+
+    A game is determined by the seed of its pytromino sequence, its rules
+    (randomizer, board size, nextup length, spawn) and its inputs, each
+    numbered by the logical tick of PytrisController it happened in, which
+    steps at a fixed rate whatever the frame rate. Gravity is an input too,
+    so a replay does not depend on frame rate or wall clock.
+
+    Replays are saved as JSON with the inputs as one string of
+    "<ticks since the previous input><code>" tokens, e.g. "0L 0L 30G 2H".
+
+    python replay.py game.json               # check the recorded result
+    python replay.py game.json --render 4    # watch at 4 times real time
+"""
+import argparse
+import json
+import sys
+import time
+from collections import namedtuple
+from random import Random
+from board import Board
+from colors import EMPTY
+from engine import PytrisGame, Action
+from randomizer import make_randomizer
+
+Replay = namedtuple('Replay', [
+    'seed',        # seed of the pytromino sequence
+    'randomizer',  # name in randomizer.RANDOMIZERS
+    'num_cols',
+    'num_rows',
+    'num_nextup',
+    'spawn',       # (x, y) where pytrominos are placed
+    'fps',         # logical ticks per second when it was played
+    'inputs',      # tuple of (tick, Action or None for a gravity tick)
+    'result',      # dict of the final score, lines and pieces, or None
+])
+
+VERSION = 1
+
+# One letter per input, None is gravity
+_CODES = {
+    Action.LEFT: 'L',
+    Action.RIGHT: 'R',
+    Action.DOWN: 'D',
+    Action.ROTATE: 'U',
+    Action.HARD_DROP: 'H',
+    Action.HOLD: 'C',
+    None: 'G',
+}
+_INPUTS = {code: action for action, code in _CODES.items()}
+
+
+class ReplayRecorder:
+    """ Collects the inputs of a game as they are applied
+
+    >>> recorder = ReplayRecorder(7, 'uniform', 10, 20)
+    >>> recorder.record(0, Action.LEFT)
+    >>> recorder.record(30, None)
+    >>> recorder.get_replay().inputs
+    ((0, <Action.LEFT: 1>), (30, None))
+    """
+
+    def __init__(self, seed, randomizer, num_cols, num_rows, num_nextup=4,
+                 spawn=(4, 0), fps=60):
+        self._header = (seed, randomizer, num_cols, num_rows, num_nextup,
+                        tuple(spawn), fps)
+        self._inputs = []
+
+    def record(self, tick, action):
+        """ Record action, None for gravity, as applied at logical tick
+        """
+        assert not self._inputs or tick >= self._inputs[-1][0], \
+            f'Ticks must not decrease: {tick}'
+        self._inputs.append((tick, action))
+
+    def get_replay(self, game=None):
+        """ Returns the Replay of the inputs so far, with the result of game
+            when given
+        """
+        result = get_result(game) if game is not None else None
+        return Replay(*self._header, tuple(self._inputs), result)
+
+
+def get_result(game):
+    """ Returns the result of game as recorded in a Replay
+    """
+    return {
+        'score': game.get_score(),
+        'lines': game.get_lines(),
+        'pieces': game.get_pieces(),
+    }
+
+
+def make_board(replay, backend='bitboard'):
+    """ Returns a new empty Board the size of that of replay
+    """
+    return Board(replay.num_cols, replay.num_rows, EMPTY, backend=backend,
+                 compact=backend != 'numpy')
+
+
+def make_game(replay, backend='bitboard', listener=None):
+    """ Returns a new PytrisGame with the rules and pytromino sequence of
+        replay, not started
+    """
+    return PytrisGame(
+        make_board(replay, backend),
+        num_nextup=replay.num_nextup,
+        spawn=replay.spawn,
+        randomizer=make_randomizer(replay.randomizer, Random(replay.seed)),
+        listener=listener
+    )
+
+
+def simulate(replay, backend='bitboard'):
+    """ Play replay headless, as fast as possible. Returns the finished
+        PytrisGame
+    """
+    game = make_game(replay, backend)
+    game.start()
+    step, tick = game.step, game.tick
+    for _, action in replay.inputs:
+        if action is None:
+            tick()
+        else:
+            step(action)
+    return game
+
+
+def check(replay, backend='bitboard'):
+    """ Returns whether simulating replay gives its recorded result
+    """
+    return get_result(simulate(replay, backend)) == replay.result
+
+
+def dumps(replay):
+    """ Returns replay as a JSON string
+
+    >>> replay = ReplayRecorder(7, '7bag', 10, 20).get_replay()
+    >>> loads(dumps(replay)) == replay
+    True
+    """
+    tokens = []
+    prev_tick = 0
+    for tick, action in replay.inputs:
+        tokens.append(f'{tick - prev_tick}{_CODES[action]}')
+        prev_tick = tick
+    return json.dumps({
+        'version': VERSION,
+        'seed': replay.seed,
+        'randomizer': replay.randomizer,
+        'cols': replay.num_cols,
+        'rows': replay.num_rows,
+        'nextup': replay.num_nextup,
+        'spawn': list(replay.spawn),
+        'fps': replay.fps,
+        'result': replay.result,
+        'inputs': ' '.join(tokens),
+    })
+
+
+def loads(text):
+    """ Returns the Replay of a JSON string made by dumps
+    """
+    data = json.loads(text)
+    if data.get('version') != VERSION:
+        raise ValueError(f'Unsupported replay version: {data.get("version")}')
+    inputs = []
+    tick = 0
+    for token in data['inputs'].split():
+        tick += int(token[:-1])
+        inputs.append((tick, _INPUTS[token[-1]]))
+    return Replay(data['seed'], data['randomizer'], data['cols'],
+                  data['rows'], data['nextup'], tuple(data['spawn']),
+                  data['fps'], tuple(inputs), data['result'])
+
+
+def save(replay, path):
+    with open(path, 'w') as f:
+        f.write(dumps(replay) + '\n')
+
+
+def load(path):
+    with open(path) as f:
+        return loads(f.read())
+
+
+def render(replay, speed=1.0):
+    """ Play replay in a window through PytrisViewManager at speed times
+        the rate it was played at, 0 for as fast as possible
+    """
+    import pygame
+    from game_ctl import PytrisController
+    from view import PytrisViewManager
+    pygame.init()
+    gui = PytrisViewManager(pygame, replay.num_cols, replay.num_rows,
+                            num_nextup=replay.num_nextup)
+    controller = PytrisController(
+        make_board(replay), gui, max_fps=replay.fps,
+        a=replay.seed, randomizer=replay.randomizer
+    )
+    controller.play_replay(replay, speed)
+    pygame.quit()
+    return controller.get_game()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play a Pytris replay')
+    parser.add_argument('path', help='replay file saved by PytrisController')
+    parser.add_argument('--render', type=float, metavar='SPEED', default=None,
+                        help='show it at SPEED times real time, 0 for as '
+                             'fast as possible')
+    parser.add_argument('--backend', default='bitboard',
+                        choices=['list', 'bitboard', 'numpy'])
+    args = parser.parse_args(argv)
+    replay = load(args.path)
+
+    start_time = time.perf_counter()
+    if args.render is not None:
+        game = render(replay, args.render)
+    else:
+        game = simulate(replay, args.backend)
+    elapsed = time.perf_counter() - start_time
+    played = get_result(game)
+    ticks = replay.inputs[-1][0] if replay.inputs else 0
+    print(f'{len(replay.inputs)} inputs over {ticks} ticks '
+          f'in {elapsed:.3f} s ({ticks / replay.fps / max(elapsed, 1e-9):.0f}x '
+          f'real time)')
+    print(f'played:   {played}')
+    print(f'recorded: {replay.result}')
+    if replay.result is not None and played != replay.result:
+        print('MISMATCH')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+""" Lookahead for the built-in agent: a beam search over the current
+    pytromino, the nextup queue and the holder.
+
+    Every ply places one pytromino, the next one in the queue or, with a
+    hold first, the held one (or the one after next when the holder is
+    empty). The nodes of a ply are scored by the heuristic of agent.py plus
+    the lines they cleared on the way, and only the best beam_width nodes
+    are expanded further, nodes of the same position keeping the best path.
+    The placements and their scores from a position are kept in a bounded
+    LRU transposition table keyed by the occupied cells and the type, so
+    positions reached again, in this decision or the next, are not
+    searched twice. A time budget stops the search after the last complete
+    ply, so it can run within a frame or as fast as possible in selfplay.py.
+"""
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from agent import HeuristicAgent, FeatureBoard, WEIGHTS
+from engine import Action
+from models import pytromino_factory
+from movegen import generate_placements
+
+_Node = namedtuple('_Node', [
+    'features',  # FeatureBoard after the placements so far
+    'cur',       # type of the pytromino to place next
+    'origin',    # (x, y) origin it starts from
+    'rotation',  # rotation it starts in
+    'held',      # type in the holder, None when empty
+    'can_hold',  # whether the holder is open
+    'index',     # index in the queue of the pytromino after cur
+    'lines',     # weighted lines cleared by the placements so far
+    'value',     # lines plus the heuristic score of features
+    'first',     # the decision at the root: Action.HOLD or Placement
+])
+
+
+class TranspositionTable:
+    """ A bounded mapping that forgets the least recently used key first
+
+    >>> table = TranspositionTable(2)
+    >>> table['a'] = 1
+    >>> table['b'] = 2
+    >>> table.get('a')
+    1
+    >>> table['c'] = 3
+    >>> table.get('b') is None, len(table)
+    (True, 2)
+    """
+
+    def __init__(self, size=4096):
+        assert size > 0, f'Invalid size: {size}'
+        self._size = size
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __setitem__(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """ Returns the value of key, None when it is not in the table
+        """
+        value = self._entries.get(key)
+        if value is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+            self._entries.move_to_end(key)
+        return value
+
+    def get_hit_rate(self):
+        lookups = self._hits + self._misses
+        return self._hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self._entries.clear()
+
+
+class BeamSearchAgent(HeuristicAgent):
+    """ A HeuristicAgent deciding on the placement that leads to the best
+        position a few pytrominos ahead, holding when that is better
+
+    >>> from board import Board
+    >>> from colors import EMPTY
+    >>> from engine import PytrisGame
+    >>> from random import Random
+    >>> from randomizer import UniformRandomizer
+    >>> game = PytrisGame(Board(cell_item=EMPTY),
+    ...                   randomizer=UniformRandomizer(Random(0)))
+    >>> game.start()
+    >>> agent = BeamSearchAgent(depth=2, beam_width=4)
+    >>> while game.get_pieces() < 100:
+    ...     _ = game.step(agent.act(game))
+    ...     _ = game.tick()
+    >>> game.is_game_over(), game.get_lines()
+    (False, 38)
+    """
+
+    def __init__(self, rng=None, weights=WEIGHTS, depth=3, beam_width=4,
+                 time_budget=None, table_size=512):
+        """
+        Parameters
+        ----------
+        rng : random.Random
+            Unused, the agent is deterministic
+
+        weights : Features
+            Weight of every feature. Default agent.WEIGHTS
+
+        depth : int
+            Number of pytrominos to place ahead, the current one included,
+            None for as many as are known. Default 3
+
+        beam_width : int
+            Number of nodes expanded per ply. Default 4
+
+        time_budget : float
+            Seconds a decision may take, the first ply is always searched.
+            Default None for no limit
+
+        table_size : int
+            Number of positions kept in the transposition table, each with
+            the boards of all its placements. Default 512
+        """
+        super().__init__(rng, weights)
+        assert depth is None or depth > 0, f'Invalid depth: {depth}'
+        assert beam_width > 0, f'Invalid beam_width: {beam_width}'
+        self._depth = depth
+        self._beam_width = beam_width
+        self._time_budget = time_budget
+        self._table = TranspositionTable(table_size)
+        self._hold_tried = None
+
+# --------------------------------- Open APIs -------------------------------- #
+
+    def decide(self, game):
+        pytromino = game.get_cur_pytromino()
+        # A hold that did not fit leaves the same pytromino, don't retry it
+        can_hold = game.can_hold() and pytromino is not self._hold_tried
+        first = self.search(
+            FeatureBoard.from_board(game.get_board()), pytromino.get_type(),
+            game.get_nextup(), game.get_held(), can_hold,
+            pytromino.get_origin(), pytromino.get_rotation(),
+            pytromino.get_blocks_pos()[0], game.get_spawn()
+        )
+        if first is Action.HOLD:
+            self._hold_tried = pytromino
+        return first
+
+    def search(self, features, cur, nextup, held=None, can_hold=True,
+               origin=(4, 0), rotation=0, hold_at=(4, 0), spawn=(4, 0)):
+        """ Returns the decision for the pytromino of type cur, Action.HOLD
+            or the movegen.Placement to freeze it at, None when it fits
+            nowhere
+
+        Parameters
+        ----------
+        features : FeatureBoard
+            The board, it is not modified
+
+        cur : Pytromino.Types
+            Type of the current pytromino, which is at origin in rotation
+
+        nextup : tuple[Pytromino.Types]
+            The upcoming types
+
+        held : Pytromino.Types
+            The type in the holder, None if it is empty
+
+        can_hold : bool
+            Whether the current pytromino may be held
+
+        hold_at : (int, int)
+            Where a pytromino coming out of the holder is placed
+
+        spawn : (int, int)
+            Where new pytrominos are placed
+        """
+        deadline = None
+        if self._time_budget is not None:
+            deadline = time.perf_counter() + self._time_budget
+        num_plies = len(nextup) + 1
+        if self._depth is not None:
+            num_plies = min(num_plies, self._depth)
+        root = _Node(features, cur, origin, rotation, held, can_hold, 0, 0.0,
+                     0.0, None)
+        beam = [root]
+        best = None
+        for ply in range(num_plies):
+            children = {}
+            for node in beam:
+                self._expand(node, nextup, hold_at, spawn, children)
+                if deadline is not None and ply \
+                        and time.perf_counter() > deadline:
+                    return best
+            if not children:
+                break
+            beam = sorted(children.values(), key=lambda n: n.value,
+                          reverse=True)[:self._beam_width]
+            best = beam[0].first
+        return best
+
+    def get_table(self):
+        return self._table
+
+# ----------------------------- Helper Functions ----------------------------- #
+
+    def _expand(self, node, nextup, hold_at, spawn, children):
+        """ Add the nodes of every placement from node to children, keeping
+            the best of those with the same position. A pytromino held at
+            the root comes out of the holder at hold_at, where the current
+            one is, but past the root the current one is still at spawn
+
+        >>> from board import Board
+        >>> from colors import EMPTY
+        >>> from models import Pytromino
+        >>> T, I = Pytromino.Types.T, Pytromino.Types.I
+        >>> features = FeatureBoard.from_board(Board(cell_item=EMPTY))
+        >>> node = _Node(features, T, _origin(T, (4, 0)), 0, I, True, 1,
+        ...              0.0, 0.0, Action.HOLD)
+        >>> children = {}
+        >>> BeamSearchAgent()._expand(node, (T, T), (4, 19), (4, 0), children)
+        >>> sum(child.held is T for child in children.values())
+        17
+        """
+        if node.cur is None:
+            # Past the known queue, after a hold into the empty holder
+            return
+        options = [(node.cur, node.origin, node.rotation, node.held,
+                    node.index, None)]
+        if node.can_hold:
+            hold = Action.HOLD if node.first is None else node.first
+            if node.held is not None:
+                at = hold_at if node.first is None else spawn
+                options.append((node.held, _origin(node.held, at), 0,
+                                node.cur, node.index, hold))
+            elif node.index < len(nextup):
+                new = nextup[node.index]
+                options.append((new, _origin(new, spawn), 0, node.cur,
+                                node.index + 1, hold))
+        for cur, origin, rotation, held, index, first in options:
+            # The next pytromino, none past the end of the known queue
+            if index < len(nextup):
+                next_cur, next_origin = nextup[index], _origin(nextup[index],
+                                                               spawn)
+            else:
+                next_cur, next_origin = None, None
+            for placement, child, lines, score in self._placements(
+                    node.features, cur, origin, rotation):
+                child_first = first
+                if child_first is None:
+                    child_first = node.first if node.first is not None \
+                        else placement
+                key = (child.key(), next_cur, held)
+                value = node.lines + score
+                other = children.get(key)
+                if other is not None and other.value >= value:
+                    continue
+                children[key] = _Node(
+                    child, next_cur, next_origin, 0, held, True, index + 1,
+                    node.lines + self._weights.lines * lines, value,
+                    child_first
+                )
+
+    def _placements(self, features, cur, origin, rotation):
+        """ Returns the placements of a cur pytromino from origin in
+            rotation on features, each with the FeatureBoard after it, its
+            cleared lines and its score, through the transposition table
+        """
+        key = (features.key(), cur, origin, rotation)
+        entry = self._table.get(key)
+        if entry is None:
+            entry = []
+            for placement in generate_placements(
+                    features, cur, origin, paths=False, rotation=rotation):
+                child = features.copy()
+                lines = child.place(placement.blocks)
+                if lines is None:
+                    # Sticks out above the board, game over
+                    continue
+                entry.append((placement, child, lines,
+                              child.score(self._weights)))
+            self._table[key] = entry
+        return entry
+
+
+@lru_cache(maxsize=None)
+def _origin(pytromino_type, coordinate):
+    """ Returns the origin of a pytromino_type pytromino placed at
+        coordinate, as PytrisGame places them
+    """
+    pytromino = pytromino_factory(pytromino_type)
+    pytromino.place_at(coordinate)
+    return pytromino.get_origin()
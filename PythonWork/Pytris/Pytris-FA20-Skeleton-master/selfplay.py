@@ -0,0 +1,195 @@
+""" Play many seeded games of Pytris with an agent across a process pool.
+
+    Every game has its own random.Random for its pytromino sequence and one
+    for its agent, both derived from the game's seed, so a game plays out
+    the same wherever and in whichever order it runs. Results are written to
+    a JSONL file, one line per game, as they come in, followed by aggregate
+    statistics on stdout.
+
+    python selfplay.py --games 1000 --seed 0 --agent random --out games.jsonl
+
+    An agent is a class (or any callable) taking a random.Random and
+    returning an object with an act(game) method, which gets an
+    engine.PytrisGame and returns the engine.Action to step. It is named in
+    AGENTS or given as module:attribute.
+"""
+import argparse
+import importlib
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from random import Random
+from board import Board
+from colors import EMPTY
+from engine import PytrisGame, Action
+from agent import HeuristicAgent
+from search import BeamSearchAgent
+from randomizer import RANDOMIZERS, make_randomizer
+
+
+class RandomAgent:
+    """ Picks a uniformly random action every step
+    """
+
+    def __init__(self, rng):
+        self._rng = rng
+        self._actions = list(Action)
+
+    def act(self, game):
+        return self._rng.choice(self._actions)
+
+
+AGENTS = {
+    'random': RandomAgent,
+    'heuristic': HeuristicAgent,
+    'beam': BeamSearchAgent,
+}
+
+
+def load_agent(spec):
+    """ Returns the agent factory named spec in AGENTS, or the attribute of
+        a module given as module:attribute
+
+    >>> load_agent('random') is RandomAgent
+    True
+    >>> load_agent('selfplay:RandomAgent') is RandomAgent
+    True
+    """
+    if spec in AGENTS:
+        return AGENTS[spec]
+    module_name, sep, attr = spec.partition(':')
+    if not sep:
+        raise ValueError(f'Unknown agent: "{spec}"')
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def play_game(seed, agent='random', num_cols=10, num_rows=20,
+              max_pieces=None, backend='bitboard', randomizer='uniform'):
+    """ Play one game to the end, or until max_pieces pytrominos have been
+        frozen, stepping one agent action and one gravity tick at a time
+
+    Returns
+    -------
+    dict
+        seed, score, lines, pieces, steps and duration in seconds
+
+    >>> result = play_game(7)
+    >>> result == {**play_game(7), 'duration': result['duration']}
+    True
+    >>> sorted(result)
+    ['duration', 'lines', 'pieces', 'score', 'seed', 'steps']
+    """
+    start_time = time.perf_counter()
+    agent = load_agent(agent)(Random(f'{seed}:agent'))
+    game = PytrisGame(
+        Board(num_cols, num_rows, EMPTY, backend=backend,
+              compact=backend != 'numpy'),
+        randomizer=make_randomizer(randomizer, Random(f'{seed}:pieces'))
+    )
+    game.start()
+    steps = 0
+    while not game.is_game_over():
+        if max_pieces is not None and game.get_pieces() >= max_pieces:
+            break
+        action = agent.act(game)
+        game.step(action)
+        # A hard drop already froze the pytromino, as in VecPytrisEnv
+        if action is not Action.HARD_DROP:
+            game.tick()
+        steps += 1
+    return {
+        'seed': seed,
+        'score': game.get_score(),
+        'lines': game.get_lines(),
+        'pieces': game.get_pieces(),
+        'steps': steps,
+        'duration': time.perf_counter() - start_time,
+    }
+
+
+def _play_game_args(args):
+    return play_game(*args)
+
+
+def summarize(results):
+    """ Returns aggregate statistics of a list of play_game results
+    """
+    scores = [result['score'] for result in results]
+    summary = {'games': len(results)}
+    if not results:
+        return summary
+    summary.update({
+        'score_mean': float(statistics.mean(scores)),
+        'score_median': statistics.median(scores),
+        'score_stdev': statistics.pstdev(scores),
+        'score_min': min(scores),
+        'score_max': max(scores),
+        'lines_mean': float(statistics.mean(r['lines'] for r in results)),
+        'pieces_mean': float(statistics.mean(r['pieces'] for r in results)),
+        'duration_total': sum(r['duration'] for r in results),
+    })
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Play seeded games of Pytris with an agent'
+    )
+    parser.add_argument('--games', type=int, default=100,
+                        help='number of games to play (default: 100)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first game, game i uses seed + i '
+                             '(default: 0)')
+    parser.add_argument('--agent', default='random',
+                        help=f'one of {", ".join(AGENTS)} or module:attribute '
+                             '(default: random)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes (default: all CPUs)')
+    parser.add_argument('--max-pieces', type=int, default=None,
+                        help='end games after this many pytrominos')
+    parser.add_argument('--cols', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=20)
+    parser.add_argument('--backend', default='bitboard',
+                        choices=['list', 'bitboard', 'numpy'])
+    parser.add_argument('--randomizer', default='uniform',
+                        choices=list(RANDOMIZERS))
+    parser.add_argument('--out', default='selfplay.jsonl',
+                        help='JSONL file for per game results '
+                             '(default: selfplay.jsonl)')
+    args = parser.parse_args(argv)
+    # Fail early on a bad agent instead of in every worker
+    load_agent(args.agent)
+
+    game_args = [
+        (args.seed + i, args.agent, args.cols, args.rows, args.max_pieces,
+         args.backend, args.randomizer)
+        for i in range(args.games)
+    ]
+    results = []
+    start_time = time.perf_counter()
+    with open(args.out, 'w') as out, \
+            ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(_play_game_args, game)
+                   for game in game_args]
+        # Write games in the order they finish so that a long game does not
+        # hold back the ones after it, and flush so the file can be followed
+        for future in as_completed(futures):
+            result = future.result()
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+            results.append(result)
+    elapsed = time.perf_counter() - start_time
+
+    summary = summarize(results)
+    summary['elapsed'] = elapsed
+    summary['games_per_sec'] = len(results) / elapsed if elapsed else 0.0
+    for key, value in summary.items():
+        print(f'{key:>16}: {value:.3f}' if isinstance(value, float)
+              else f'{key:>16}: {value}')
+    return summary
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+""" Many games of Pytris stepped at once, with the rules of engine.PytrisGame.
+
+    The state of N games lives in a few numpy arrays: the boards as one
+    (N, num_rows, num_cols) array of palette indices (0 is empty, see
+    colors.make_palette) and one entry per game for the current pytromino,
+    nextup, holder, score and game over. A step applies one action to every
+    game with array operations over all of them; the only Python loops are
+    over rows, e.g. to find how far a hard drop goes, never over games or
+    cells. The rotation tables of models.SHAPES are shared as one
+    (types, 4 rotations, 4 blocks, 2) array.
+"""
+from engine import Action
+from models import Pytromino, SHAPES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Pytromino types are numbered in this order
+TYPES = tuple(Pytromino.Types)
+# Action values, and NOOP for a step without an action
+NOOP = 0
+LEFT, RIGHT, DOWN, ROTATE, HARD_DROP, HOLD = (
+    action.value for action in (Action.LEFT, Action.RIGHT, Action.DOWN,
+                                Action.ROTATE, Action.HARD_DROP, Action.HOLD)
+)
+
+
+class VecPytrisEnv:
+
+    def __init__(self, num_envs, num_cols=10, num_rows=20, num_nextup=4,
+                 spawn=(4, 0), seed=None):
+        """ num_envs independent games of Pytris
+
+        Parameters
+        ----------
+        num_envs : int
+            Number of games
+
+        num_cols, num_rows : int
+            Size of every board. Default 10 x 20
+
+        num_nextup : int
+            Number of upcoming pytromino types kept per game. Default 4
+
+        spawn : (int, int)
+            Where new pytrominos are placed. Default (4, 0)
+
+        seed : int
+            Seed of the numpy random generator that draws the pytromino
+            types, uniformly. Default None for a fresh seed
+
+        >>> env = VecPytrisEnv(3, seed=0)
+        >>> boards, scores, dones = env.reset()
+        >>> boards.shape, scores.tolist(), dones.tolist()
+        ((3, 20, 10), [0, 0, 0], [False, False, False])
+        >>> boards, scores, dones = env.step([HARD_DROP, DOWN, NOOP])
+        >>> scores.tolist() # 2 points per hard dropped row, 1 per soft drop
+        [38, 1, 0]
+        >>> (boards != 0).sum(axis=(1, 2)).tolist()
+        [4, 0, 0]
+        """
+        if np is None:
+            raise ImportError('VecPytrisEnv requires numpy')
+        assert num_envs > 0 and num_nextup > 0
+        self._num_envs = num_envs
+        self._num_cols = num_cols
+        self._num_rows = num_rows
+        self._num_nextup = num_nextup
+        self._spawn = spawn
+        self._rng = np.random.default_rng(seed)
+        # (type, rotation, block) -> (dx, dy) of every block
+        self._offsets = np.array(
+            [SHAPES[t].rotations for t in TYPES], dtype=np.int64
+        )
+        self._color_index = np.array(
+            [SHAPES[t].color_index for t in TYPES], dtype=np.uint8
+        )
+        # Action value -> (dx, dy, drot)
+        self._moves = np.zeros((len(Action) + 1, 3), dtype=np.int64)
+        self._moves[LEFT] = (-1, 0, 0)
+        self._moves[RIGHT] = (1, 0, 0)
+        self._moves[DOWN] = (0, 1, 0)
+        self._moves[ROTATE] = (0, 0, 1)
+        self.reset()
+
+# --------------------------------- Open APIs -------------------------------- #
+
+    def reset(self, seed=None):
+        """ Start every game over on an empty board. Returns the boards, the
+            scores and the game over flags as for step()
+        """
+        if seed is not None:
+            self._rng = np.random.default_rng(seed)
+        n = self._num_envs
+        self._boards = np.zeros(
+            (n, self._num_rows, self._num_cols), dtype=np.uint8
+        )
+        self._types = np.zeros(n, dtype=np.int64)
+        self._rotations = np.zeros(n, dtype=np.int64)
+        self._xs = np.zeros(n, dtype=np.int64)
+        self._ys = np.zeros(n, dtype=np.int64)
+        all_games = np.arange(n)
+        self._nextup = np.stack(
+            [self._draw_types(all_games) for _ in range(self._num_nextup)],
+            axis=1
+        )
+        self._held = np.full(n, -1, dtype=np.int64)
+        self._hold_open = np.ones(n, dtype=bool)
+        self._scores = np.zeros(n, dtype=np.int64)
+        self._lines = np.zeros(n, dtype=np.int64)
+        self._pieces = np.zeros(n, dtype=np.int64)
+        self._dones = np.zeros(n, dtype=bool)
+        self._spawn_pytrominos(all_games)
+        return self._observe()
+
+    def step(self, actions, tick=True):
+        """ Apply one action to every game, then one gravity tick (see
+            PytrisGame.tick) to the games that did not hard drop. Games that
+            are over are left as they are
+
+        Parameters
+        ----------
+        actions : array of int
+            One Action value per game, NOOP for no action
+
+        tick : bool
+            Whether to apply gravity after the actions. Default True
+
+        Returns
+        -------
+        (array, array, array)
+            Read-only views of the boards (N, num_rows, num_cols), the
+            scores (N,) and the game over flags (N,). They follow the state
+            of the games, copy them to keep them
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        assert actions.shape == (self._num_envs,), \
+            f'Expected {self._num_envs} actions: {actions.shape}'
+        live = ~self._dones
+        moved = np.flatnonzero(
+            live & np.isin(actions, (LEFT, RIGHT, DOWN, ROTATE))
+        )
+        if moved.size:
+            dx, dy, drot = self._moves[actions[moved]].T
+            success = self._try_move(moved, dx, dy, drot)
+            self._scores[moved[success & (dy == 1)]] += 1
+        held = np.flatnonzero(live & (actions == HOLD))
+        if held.size:
+            self._hold(held)
+        dropped = np.flatnonzero(live & (actions == HARD_DROP))
+        if dropped.size:
+            distance = self._drop_distance(dropped)
+            self._ys[dropped] += distance
+            self._scores[dropped] += 2 * distance
+            self._lock(dropped)
+        if tick:
+            ticked = np.flatnonzero(~self._dones & (actions != HARD_DROP))
+            if ticked.size:
+                zeros = np.zeros(ticked.size, dtype=np.int64)
+                down = self._try_move(ticked, zeros, zeros + 1, zeros)
+                self._lock(ticked[~down])
+        return self._observe()
+
+    def get_num_envs(self):
+        return self._num_envs
+
+    def get_boards(self):
+        """ Returns a read-only view of the (N, num_rows, num_cols) boards
+        """
+        return self._read_only(self._boards)
+
+    def get_pytrominos(self):
+        """ Returns read-only views of the type index (see TYPES), rotation
+            and origin x and y of the current pytromino of every game
+        """
+        return tuple(self._read_only(a) for a in
+                     (self._types, self._rotations, self._xs, self._ys))
+
+    def get_pytromino_cells(self):
+        """ Returns the x and y of the blocks of every current pytromino,
+            each shaped (N, 4)
+        """
+        return self._cells(self._types, self._rotations, self._xs, self._ys)
+
+    def get_nextup(self):
+        """ Returns a read-only (N, num_nextup) view of the upcoming type
+            indices
+        """
+        return self._read_only(self._nextup)
+
+    def get_held(self):
+        """ Returns a read-only view of the held type index of every game,
+            -1 when the holder is empty
+        """
+        return self._read_only(self._held)
+
+    def get_scores(self):
+        return self._read_only(self._scores)
+
+    def get_lines(self):
+        """ Returns a read-only view of the rows cleared by every game
+        """
+        return self._read_only(self._lines)
+
+    def get_pieces(self):
+        """ Returns a read-only view of the number of pytrominos frozen by
+            every game
+        """
+        return self._read_only(self._pieces)
+
+    def get_dones(self):
+        return self._read_only(self._dones)
+
+    def to_board(self, i, backend='list'):
+        """ Returns a copy of the board of game i as a Board with cell_item
+            colors.EMPTY
+        """
+        from board import Board
+        from colors import EMPTY
+        return Board(
+            self._num_cols, self._num_rows, EMPTY,
+            grid=self._boards[i].ravel().tolist(), backend=backend
+        )
+
+# ----------------------------- Helper Functions ----------------------------- #
+
+    def _observe(self):
+        return self.get_boards(), self.get_scores(), self.get_dones()
+
+    @staticmethod
+    def _read_only(array):
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def _draw_types(self, games):
+        """ Returns one random type index for each of games
+        """
+        return self._rng.integers(0, len(TYPES), size=len(games))
+
+    def _cells(self, types, rotations, xs, ys):
+        """ Returns the x and y of the blocks of pytrominos of types,
+            rotations and origins xs, ys, each shaped (len(types), 4)
+        """
+        offsets = self._offsets[types, rotations]
+        return xs[:, None] + offsets[..., 0], ys[:, None] + offsets[..., 1]
+
+    def _fits(self, games, types, rotations, xs, ys):
+        """ Returns for each of games whether the pytromino of types,
+            rotations and origins xs, ys fits on its board, as Board.fits
+        """
+        cx, cy = self._cells(types, rotations, xs, ys)
+        fits = (cx >= 0) & (cx < self._num_cols) & (cy < self._num_rows)
+        return (fits & ~self._filled(games, cx, cy)).all(axis=1)
+
+    def _filled(self, games, cx, cy):
+        """ Returns whether each cell cx, cy of the board of games is on the
+            board and filled
+        """
+        on_board = (cx >= 0) & (cx < self._num_cols) \
+            & (cy >= 0) & (cy < self._num_rows)
+        return on_board & (self._boards[
+            games[:, None],
+            np.clip(cy, 0, self._num_rows - 1),
+            np.clip(cx, 0, self._num_cols - 1)
+        ] != 0)
+
+    def _try_move(self, games, dx, dy, drot):
+        """ Move the pytrominos of games where they fit, see
+            Pytromino.try_move. Returns which moved
+        """
+        rotations = (self._rotations[games] + drot) & 3
+        xs = self._xs[games] + dx
+        ys = self._ys[games] + dy
+        success = self._fits(games, self._types[games], rotations, xs, ys)
+        moved = games[success]
+        self._rotations[moved] = rotations[success]
+        self._xs[moved] = xs[success]
+        self._ys[moved] = ys[success]
+        return success
+
+    def _drop_distance(self, games):
+        """ Returns how many rows the pytrominos of games can go down
+        """
+        types = self._types[games]
+        rotations = self._rotations[games]
+        xs = self._xs[games]
+        ys = self._ys[games]
+        distance = np.zeros(games.size, dtype=np.int64)
+        falling = np.ones(games.size, dtype=bool)
+        for d in range(1, self._num_rows + 1):
+            falling &= self._fits(games, types, rotations, xs, ys + d)
+            if not falling.any():
+                break
+            distance[falling] = d
+        return distance
+
+    def _lock(self, games):
+        """ Freeze the pytrominos of games, clear rows and spawn the next
+        """
+        if not games.size:
+            return
+        self._hold_open[games] = True
+        self._pieces[games] += 1
+        types = self._types[games]
+        cx, cy = self._cells(types, self._rotations[games],
+                             self._xs[games], self._ys[games])
+        on_board = (cx >= 0) & (cx < self._num_cols) & (cy >= 0)
+        rows = np.broadcast_to(games[:, None], cy.shape)
+        colors = np.broadcast_to(self._color_index[types][:, None], cy.shape)
+        self._boards[rows[on_board], cy[on_board], cx[on_board]] = \
+            colors[on_board]
+        # Blocks frozen off the board end the game
+        over = ~on_board.all(axis=1)
+        self._dones[games[over]] = True
+        games = games[~over]
+        boards = self._boards[games]
+        full = (boards != 0).all(axis=2)
+        num_cleared = full.sum(axis=1)
+        clearing = num_cleared > 0
+        if clearing.any():
+            boards, full = boards[clearing], full[clearing]
+            # A stable sort puts the full rows on top, the others keep their
+            # order below them, then the full rows are emptied
+            order = np.argsort(~full, axis=1, kind='stable')
+            boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+            boards[np.take_along_axis(full, order, axis=1)] = 0
+            cleared = games[clearing]
+            self._boards[cleared] = boards
+            self._lines[cleared] += num_cleared[clearing]
+            # Each cleared row is worth 100 points for now
+            self._scores[cleared] += 100 * num_cleared[clearing]
+        self._spawn_pytrominos(games)
+
+    def _spawn_pytrominos(self, games):
+        if not games.size:
+            return
+        self._types[games] = self._nextup[games, 0]
+        self._nextup[games, :-1] = self._nextup[games, 1:]
+        self._nextup[games, -1] = self._draw_types(games)
+        self._place(games, self._spawn[0], self._spawn[1])
+
+    def _place(self, games, x, y):
+        self._rotations[games] = 0
+        self._xs[games] = x
+        self._ys[games] = y
+        # If a block of the new pytromino on the board is not free, game over
+        cx, cy = self._cells(self._types[games], self._rotations[games],
+                             self._xs[games], self._ys[games])
+        blocked = self._filled(games, cx, cy).any(axis=1)
+        self._dones[games[blocked]] = True
+
+    def _hold(self, games):
+        games = games[self._hold_open[games]]
+        types = self._types[games]
+        held = self._held[games]
+        # An empty holder takes the pytromino, the next one spawns
+        storing = games[held < 0]
+        self._held[storing] = self._types[storing]
+        self._hold_open[storing] = False
+        self._spawn_pytrominos(storing)
+        # Else switch with the held type, placed where the current
+        # pytromino's reference block is, if it fits there
+        switching = held >= 0
+        games, types, held = games[switching], types[switching], held[switching]
+        if not games.size:
+            return
+        cx, cy = self._cells(types, self._rotations[games],
+                             self._xs[games], self._ys[games])
+        zeros = np.zeros(games.size, dtype=np.int64)
+        fits = self._fits(games, held, zeros, cx[:, 0], cy[:, 0])
+        games = games[fits]
+        self._held[games] = types[fits]
+        self._types[games] = held[fits]
+        self._rotations[games] = 0
+        self._xs[games] = cx[fits, 0]
+        self._ys[games] = cy[fits, 0]
+        self._hold_open[games] = False
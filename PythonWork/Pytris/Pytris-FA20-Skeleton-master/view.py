@@ -1,6 +1,7 @@
 from itertools import product
 from enum import Enum, auto
 from pathlib import Path
+from colors import make_palette
 
 class PytrisViewManager:
 
@@ -11,7 +12,8 @@ class PytrisViewManager:
 
     def __init__(self, pyg, num_cols=10, num_rows=20, window_size=(800, 640),
         bg_color=(0, 0, 25), rect_size=(25, 25), rect_color=(0, 0, 0),
-        margin=1, margin_color=(172, 172, 172), num_nextup=4):
+        margin=1, margin_color=(172, 172, 172), num_nextup=4,
+        ghost_color=(60, 60, 70), coalesce=False):
         """ The Graphical User Interface for Pytris
 
         Parameters
@@ -49,6 +51,20 @@ class PytrisViewManager:
         
         num_nextup : int
             Number of nextup pytrominos to display on the right. Default 4
+
+        ghost_color : (int, int, int)
+            RGB values to define the color of the ghost piece, the preview
+            of where the current pytromino lands. None to hide the ghost
+            piece. Default (60, 60, 70)
+
+        coalesce : bool
+            Whether render() only collects what has been drawn, for flush()
+            to update the display with once per frame. Default False to
+            update it on every render()
+
+        Every draw call takes either an RGB color or a palette index, which
+        is decoded with the palette made from rect_color, see
+        colors.make_palette
         """
         # Arguments
         self._pyg = pyg
@@ -58,9 +74,12 @@ class PytrisViewManager:
         self._bg_color = bg_color
         self._rect_vect = pyg.Vector2(rect_size)
         self._rect_color = rect_color
+        self._palette = make_palette(rect_color)
         self._margin_vect = pyg.Vector2(margin)
         self._margin_color = margin_color
         self._num_nextup = num_nextup # display 4 next-up pytrominos
+        self._ghost_color = ghost_color
+        self._coalesce = coalesce
         # Additional
         self._pyg.display.set_caption('Pytris')
         self._surface = pyg.display.set_mode(window_size)
@@ -100,6 +119,8 @@ class PytrisViewManager:
             self._main_font = self._pyg.font.SysFont('ariel', 50)
             self._game_font = self._pyg.font.SysFont('ariel', 30)
         self._number_font = self._pyg.font.SysFont('ariel', 50)
+        self._overlay_font = self._pyg.font.SysFont('couriernew,monospace', 16)
+        self._overlay_rect = None
         # Aggregate all updates
         self._updated_rects = []
 
@@ -184,7 +205,16 @@ class PytrisViewManager:
     def render(self):
         """ Actually update the display for everything that's been
             drawn to screen since the last update. Will do nothing
-            if no update has occurred
+            if no update has occurred, or when coalescing, where that is
+            left to flush()
+        """
+        if not self._coalesce:
+            self.flush()
+
+    def flush(self):
+        """ Update the display for everything that's been drawn to screen
+            since the last update, also when coalescing. Called once per
+            frame it is the only display update of the frame
         """
         if self._updated_rects:
             self._pyg.display.update(self._updated_rects)
@@ -264,6 +294,27 @@ class PytrisViewManager:
         rect = self._surface.blit(text_surface, self._window_vect // 2 - text_size // 2)
         self._updated_rects.append(rect)
 
+    def draw_overlay(self, lines, color=(255, 255, 0)):
+        """ Display lines of small text in the bottom left corner of the
+            window, replacing the previous ones. No lines clears it
+        """
+        if self._overlay_rect is not None:
+            self._updated_rects.append(self._pyg.draw.rect(
+                self._surface, self._bg_color, self._overlay_rect
+            ))
+            self._overlay_rect = None
+        if not lines:
+            return
+        line_height = self._overlay_font.get_linesize()
+        top = int(self._window_vect.y) - 8 - line_height * len(lines)
+        rects = self._surface.blits([
+            (self._overlay_font.render(line, True, color),
+             (8, top + i * line_height))
+            for i, line in enumerate(lines)
+        ])
+        self._overlay_rect = rects[0].unionall(rects[1:])
+        self._updated_rects.append(self._overlay_rect)
+
     def draw_rectangle_in_main(self, coordinate, color):
         self._draw_rect_at(coordinate, self._main_grid_topleft, color)
 
@@ -282,6 +333,12 @@ class PytrisViewManager:
     def get_rect_color(self):
         return self._rect_color
 
+    def get_ghost_color(self):
+        return self._ghost_color
+
+    def get_palette(self):
+        return self._palette
+
     def updated(self):
         return len(self._updated_rects) > 0
 
@@ -303,6 +360,8 @@ class PytrisViewManager:
             raise ValueError('Unknown grid')
 
     def _draw_rect_at(self, coordinate, topleft_vect, color):
+        if isinstance(color, int):
+            color = self._palette[color]
         coord = self._pyg.Vector2(coordinate)
         rectangle = self._pyg.Rect(
             topleft_vect + (self._margin_vect + self._rect_vect)
@@ -0,0 +1,47 @@
+""" 64-bit Zobrist keys used to hash Board and Pytromino states.
+
+    Keys are derived from a hash of what they describe rather than drawn from
+    a PRNG, so they are the same in every process and run, no matter in which
+    order they are first requested.
+"""
+from hashlib import blake2b
+
+MASK64 = (1 << 64) - 1
+
+_keys = {}
+
+
+def zobrist_key(*parts):
+    """ Returns the 64-bit key of parts e.g. zobrist_key('cell', x, item)
+
+    >>> zobrist_key('cell', 0, 1) == zobrist_key('cell', 0, 1)
+    True
+    >>> zobrist_key('cell', 0, 1) == zobrist_key('cell', 1, 0)
+    False
+    >>> 0 <= zobrist_key('row', 3) <= MASK64
+    True
+    """
+    key = _keys.get(parts)
+    if key is None:
+        digest = blake2b(repr(parts).encode(), digest_size=8).digest()
+        key = _keys[parts] = int.from_bytes(digest, 'little')
+    return key
+
+
+def row_key(row_hash, y):
+    """ Returns the contribution of a row hashing to row_hash when it sits at
+        row y. Rows are combined non-linearly (splitmix64 finalizer) so that
+        moving a row to another y changes its contribution. Empty rows
+        (row_hash 0) contribute nothing.
+
+    >>> row_key(0, 5)
+    0
+    >>> row_key(1234, 0) != row_key(1234, 1)
+    True
+    """
+    if not row_hash:
+        return 0
+    z = row_hash ^ zobrist_key('row', y)
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)